@@ -3,14 +3,27 @@
 
 from __future__ import annotations
 
+import base64
+import csv
+import hashlib
+import io
 import json
+import logging
 import os
+import queue
 import random
+import re
 import string
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from functools import wraps
+from logging.handlers import RotatingFileHandler
 from datetime import datetime, timedelta
 from typing import Optional
 
-from flask import Flask, jsonify, request, render_template, send_from_directory
+from flask import Flask, Response, g, has_request_context, jsonify, request, render_template, send_from_directory, stream_with_context
 from flask_bcrypt import Bcrypt
 from flask_cors import CORS
 from flask_jwt_extended import (
@@ -20,19 +33,115 @@ from flask_jwt_extended import (
     jwt_required,
 )
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
 from flask_socketio import SocketIO, emit, join_room, leave_room
+from sqlalchemy import bindparam, event, insert, inspect, or_, text, tuple_
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
+from sqlalchemy.orm import make_transient_to_detached
 from werkzeug.utils import secure_filename
 import uuid
-# 尝试导入valx，如果失败则使用自定义实现
+
 try:
-    import valx
-    valx_available = True
-    print("valx导入成功，使用valx敏感词过滤器")
-except Exception as e:
-    print(f"valx导入失败，使用自定义敏感词过滤器: {e}")
-    valx_available = False
-
-# 中文敏感词列表
+    import orjson  # 可选，安装后流式 JSON 编码更快
+except ImportError:
+    orjson = None
+# 敏感词过滤引擎: automaton(默认) / valx
+SENSITIVE_FILTER_ENGINE = os.getenv("SENSITIVE_FILTER_ENGINE", "automaton")
+# 是否把全角、繁体、插入空格/标点等规避写法归一化后再匹配
+SENSITIVE_NORMALIZE = os.getenv("SENSITIVE_NORMALIZE", "1") != "0"
+
+# 批量审核：超过阈值的批次分块交给进程池并行处理
+MODERATION_POOL_THRESHOLD = int(os.getenv("MODERATION_POOL_THRESHOLD", "2000"))
+MODERATION_POOL_WORKERS = int(os.getenv("MODERATION_POOL_WORKERS", "0")) or (os.cpu_count() or 1)
+MODERATION_CHUNK_SIZE = int(os.getenv("MODERATION_CHUNK_SIZE", "500"))
+MODERATION_BATCH_MAX = int(os.getenv("MODERATION_BATCH_MAX", "10000"))
+
+# 审核结果缓存：只缓存较短的文本（问候语、表情等高频重复内容）
+MODERATION_CACHE_SIZE = int(os.getenv("MODERATION_CACHE_SIZE", "10000"))
+MODERATION_CACHE_TTL = float(os.getenv("MODERATION_CACHE_TTL", "600"))
+MODERATION_CACHE_MAX_LEN = int(os.getenv("MODERATION_CACHE_MAX_LEN", "256"))
+
+# 词库热更新：每个 worker 最多每隔这么多秒查一次版本号；配置 REDIS_URL 时另有推送
+SENSITIVE_WORDS_POLL_INTERVAL = float(os.getenv("SENSITIVE_WORDS_POLL_INTERVAL", "5"))
+
+# current_user() 跨请求缓存：只用于 GET 请求，USER_CACHE_TTL=0 时关闭
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "5"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "5000"))
+
+# 匿名 GET 响应缓存：memory(进程内，按 table_versions 失效) / redis(使用 REDIS_URL) / off
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2000"))
+# 同一 key 并发未命中时，跟随者等待首个请求算完的最长秒数
+RESPONSE_CACHE_WAIT_TIMEOUT = float(os.getenv("RESPONSE_CACHE_WAIT_TIMEOUT", "5"))
+
+# 密码哈希：bcrypt 代价、独立进程池大小（0 表示在请求线程内计算）和排队上限
+BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.getenv("PASSWORD_HASH_QUEUE_TIMEOUT", "2"))
+
+# SQLite 存储配置：production 开启 WAL 等连接级 PRAGMA；default 保持 SQLite 默认行为
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# 连接池：线程模式下每个并发请求/后台线程占一个连接
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "16"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "16"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# 只读副本：逗号分隔的数据库 URL。带 @read_replica 的 GET 接口优先从副本读取，
+# 副本落后主库超过 REPLICA_MAX_LAG_SECONDS 秒时回退到主库
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "1"))
+
+# 列表接口分页：未传 limit 时的默认条数和允许的最大条数
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "50"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "100"))
+
+# 首页时间线：受众超过该人数的动态不做写扩散，改为读取时拉取
+TIMELINE_FANOUT_LIMIT = int(os.getenv("TIMELINE_FANOUT_LIMIT", "5000"))
+# 新加好友或加入小组时，补进时间线的对方/小组最近动态条数
+TIMELINE_BACKFILL_LIMIT = int(os.getenv("TIMELINE_BACKFILL_LIMIT", "200"))
+
+# 全文搜索重建索引时每批写入的行数
+SEARCH_REBUILD_BATCH_SIZE = int(os.getenv("SEARCH_REBUILD_BATCH_SIZE", "1000"))
+
+# 流式 JSON 响应每次编码并发送的行数
+JSON_STREAM_CHUNK_SIZE = int(os.getenv("JSON_STREAM_CHUNK_SIZE", "500"))
+
+# 批量导入用户时每批处理的行数
+USER_IMPORT_CHUNK_SIZE = int(os.getenv("USER_IMPORT_CHUNK_SIZE", "500"))
+
+# 请求级 SQL 统计：查询次数和数据库耗时写入 X-DB-Query-Count / X-DB-Time-Ms 响应头，
+# 查询次数达到 QUERY_STATS_LOG_MIN 的请求打一行日志（0 表示每个请求都记）。
+# 同一条 SELECT 在一个请求里执行超过 QUERY_REPEAT_LIMIT 次视为 N+1，测试模式下直接报错
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "1") != "0"
+QUERY_STATS_LOG_MIN = int(os.getenv("QUERY_STATS_LOG_MIN", "20"))
+QUERY_REPEAT_LIMIT = int(os.getenv("QUERY_REPEAT_LIMIT", "10"))
+
+# 慢查询日志：耗时达到 SLOW_QUERY_THRESHOLD_MS 的语句连同参数、路由和查询计划写入
+# JSONL 文件（默认 instance/slow_queries.jsonl），按大小轮转；阈值 <= 0 时关闭
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_LOG_PATH = os.getenv("SLOW_QUERY_LOG_PATH", "")
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "5"))
+
+# 异步审核：动态/回答/聊天消息先以 pending_review 入库，由后台批量审核后发布
+MODERATION_QUEUE_BATCH_SIZE = int(os.getenv("MODERATION_QUEUE_BATCH_SIZE", "100"))
+MODERATION_QUEUE_FLUSH_INTERVAL = float(os.getenv("MODERATION_QUEUE_FLUSH_INTERVAL", "0.2"))
+MODERATION_QUEUE_WORKERS = int(os.getenv("MODERATION_QUEUE_WORKERS", "2"))
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
+
+# 写入管道：开启后点赞、投票、签到、聊天消息等小写操作交给单个写线程，
+# 攒够 WRITE_PIPELINE_BATCH_SIZE 个或等待 WRITE_PIPELINE_FLUSH_INTERVAL 秒后成组提交
+WRITE_PIPELINE_ENABLED = os.getenv("WRITE_PIPELINE_ENABLED", "0") != "0"
+WRITE_PIPELINE_BATCH_SIZE = int(os.getenv("WRITE_PIPELINE_BATCH_SIZE", "64"))
+WRITE_PIPELINE_FLUSH_INTERVAL = float(os.getenv("WRITE_PIPELINE_FLUSH_INTERVAL", "0.001"))
+WRITE_PIPELINE_TIMEOUT = float(os.getenv("WRITE_PIPELINE_TIMEOUT", "10"))
+
+# 中文敏感词列表（词库表为空时的初始词表，运行时与 sensitive_words 表保持同步）
 chinese_sensitive_words = [
     '政治', '政府', '领导人', '国家', '党', '军队', '警察', '法律', '宪法',
     '杀', '死', '暴力', '打架', '斗殴', '伤害', '攻击', '武器', '枪', '刀',
@@ -43,6 +152,295 @@ chinese_sensitive_words = [
     '自杀', '自残', '恐怖', '爆炸', '炸弹', '病毒', '黑客'
 ]
 
+class TTLCache:
+    """线程安全的 LRU + TTL 缓存，带命中/未命中/淘汰计数"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+# 常见繁体字 -> 简体字，覆盖内置敏感词及常见规避写法
+TRADITIONAL_TO_SIMPLIFIED = dict(zip(
+    "領導國黨軍隊憲殺鬥毆傷擊槍黃網賭場時搖頭詐騙傳銷資獎費賺錢職殘彈"
+    "與門這們個會來說發開為對學體現錯關話號碼買賣價藥幣贏輸線戲機級濟務員處條請聯點",
+    "领导国党军队宪杀斗殴伤击枪黄网赌场时摇头诈骗传销资奖费赚钱职残弹"
+    "与门这们个会来说发开为对学体现错关话号码买卖价药币赢输线戏机级济务员处条请联点",
+))
+
+# 匹配时直接跳过的字符：空白、中英文标点、零宽字符
+SENSITIVE_SKIP_CHARS = frozenset(
+    string.whitespace + string.punctuation
+    + "\u3000、。，．！？；：“”‘’（）《》〈〉【】〔〕「」『』…—－～·•★☆"
+    + "\u200b\u200c\u200d\u2060\ufeff"
+    + "".join(chr(0xFF01 + i) for i in range(0x5E) if chr(0x21 + i) in string.punctuation)
+)
+
+
+def _build_char_variants():
+    """构建 变体字符 -> 规范字符 的映射：全角转半角、大写转小写、繁体转简体"""
+    variants = {}
+    for code in range(0x21, 0x7F):
+        variants[chr(code + 0xFEE0)] = chr(code).lower()
+    for ch in string.ascii_uppercase:
+        variants[ch] = ch.lower()
+    variants.update(TRADITIONAL_TO_SIMPLIFIED)
+    return variants
+
+
+SENSITIVE_CHAR_VARIANTS = _build_char_variants()
+SENSITIVE_NORMALIZE_TABLE = str.maketrans(SENSITIVE_CHAR_VARIANTS)
+
+
+class SensitiveWordMatcher:
+    """基于 Aho-Corasick 自动机的敏感词匹配器
+
+    构建时一次性把词表编译成自动机，之后每次检查只需对文本做一遍扫描，
+    即可找出所有命中并完成打码，耗时与词表大小无关。实例构建完成后只读，
+    可以在多线程间共享。
+
+    normalize=True 时，全角/大小写/繁体等变体字符在构建阶段就作为额外的
+    转移边编进自动机，扫描时无需逐字转换；标点、空白等字符原地跳过，
+    因此“赌 博”“賭博”“ＡＢ”都能命中，打码位置仍对应原文。
+    """
+
+    def __init__(self, words, normalize=True):
+        skip = SENSITIVE_SKIP_CHARS if normalize else frozenset()
+        # 去重并保留词表顺序，found_words 按词表顺序输出
+        self.words = list(dict.fromkeys(w for w in words if w))
+        keys = []
+        for word in self.words:
+            if normalize:
+                word = "".join(ch for ch in word.translate(SENSITIVE_NORMALIZE_TABLE) if ch not in skip)
+            keys.append(word)
+        goto = [{}]
+        outputs = [()]
+        for index, word in enumerate(keys):
+            if not word:
+                continue
+            state = 0
+            for ch in word:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    outputs.append(())
+                state = nxt
+            outputs[state] = outputs[state] + (index,)
+
+        # 广度优先计算失败指针，并把失败链上的输出合并到当前节点
+        fail = [0] * len(goto)
+        pending = list(goto[0].values())
+        for state in pending:
+            for ch, nxt in goto[state].items():
+                pending.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                target = goto[f].get(ch, 0)
+                fail[nxt] = target
+                if outputs[fail[nxt]]:
+                    outputs[nxt] = outputs[nxt] + outputs[fail[nxt]]
+
+        # 变体字符指向与规范字符相同的子节点
+        if normalize:
+            variants_of = {}
+            for variant, canonical in SENSITIVE_CHAR_VARIANTS.items():
+                variants_of.setdefault(canonical, []).append(variant)
+            for edges in goto:
+                for ch, nxt in list(edges.items()):
+                    for variant in variants_of.get(ch, ()):
+                        edges[variant] = nxt
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+        self._lengths = [len(key) for key in keys]
+        self._skip = skip
+
+    def __len__(self):
+        return len(self.words)
+
+    def find(self, text):
+        """返回所有命中 [(start, end, word_index), ...]，end 为开区间"""
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        lengths = self._lengths
+        skip = self._skip
+        hits = []
+        state = 0
+        for i, ch in enumerate(text):
+            if ch in skip:
+                continue
+            nxt = goto[state].get(ch)
+            while nxt is None and state:
+                state = fail[state]
+                nxt = goto[state].get(ch)
+            state = nxt or 0
+            if outputs[state]:
+                end = i + 1
+                for index in outputs[state]:
+                    hits.append((self._match_start(text, end, lengths[index]), end, index))
+        return hits
+
+    def _match_start(self, text, end, length):
+        """从命中结尾往回数 length 个非跳过字符，得到原文中的起始位置"""
+        if not self._skip:
+            return end - length
+        pos = end
+        while length:
+            pos -= 1
+            if text[pos] not in self._skip:
+                length -= 1
+        return pos
+
+    def check(self, content):
+        """单遍扫描完成检测与打码，返回格式与 check_sensitive_content 一致"""
+        hits = self.find(content) if content else []
+        if not hits:
+            return {
+                'is_safe': True,
+                'filtered_content': content,
+                'found_words': [],
+                'original_content': content
+            }
+
+        found = sorted({index for _, _, index in hits})
+        chars = list(content)
+        for start, end, _ in hits:
+            chars[start:end] = '*' * (end - start)
+        return {
+            'is_safe': False,
+            'filtered_content': ''.join(chars),
+            'found_words': [self.words[index] for index in found],
+            'original_content': content
+        }
+
+
+# 当前生效的匹配器；词表变更时整体重建后替换引用，读取方无需加锁
+sensitive_matcher = SensitiveWordMatcher(chinese_sensitive_words, normalize=SENSITIVE_NORMALIZE)
+
+# 词表版本号，参与审核缓存的键，词表一变旧结果自然失效
+sensitive_words_version = 1
+moderation_cache = TTLCache(MODERATION_CACHE_SIZE, MODERATION_CACHE_TTL)
+
+
+def rebuild_sensitive_matcher(version=None):
+    """根据 chinese_sensitive_words 重建匹配器并原子替换
+
+    version 为词库表中的版本号；不传时在本地版本上加一。
+    """
+    global sensitive_matcher, sensitive_words_version
+    sensitive_matcher = SensitiveWordMatcher(chinese_sensitive_words, normalize=SENSITIVE_NORMALIZE)
+    sensitive_words_version = sensitive_words_version + 1 if version is None else version
+    # 进程池里的匹配器是按旧词表构建的，下次批量检查时重新创建
+    _reset_moderation_pool()
+    return sensitive_matcher
+
+
+# valx 会连带导入 pandas 等重型依赖，只在第一次真正用到时才导入
+_valx_module = None
+_valx_loaded = False
+
+
+def _load_valx():
+    """按需导入 valx，导入失败时返回 None"""
+    global _valx_module, _valx_loaded
+    if not _valx_loaded:
+        try:
+            import valx
+            _valx_module = valx
+            print("valx导入成功，使用valx敏感词过滤器")
+        except Exception as e:
+            print(f"valx导入失败，使用自定义敏感词过滤器: {e}")
+        _valx_loaded = True
+    return _valx_module
+
+
+def _check_with_valx(content):
+    """通过 valx 检查敏感词，valx 不可用或出错时返回 None"""
+    valx = _load_valx()
+    if valx is None:
+        return None
+    try:
+        text_data = [content]
+        result = valx.detect_profanity(text_data, custom_words_list=chinese_sensitive_words)
+        if not result:
+            return {
+                'is_safe': True,
+                'filtered_content': content,
+                'found_words': [],
+                'original_content': content
+            }
+        filtered_data = valx.remove_profanity(text_data, custom_words_list=chinese_sensitive_words)
+        return {
+            'is_safe': False,
+            'filtered_content': filtered_data[0] if filtered_data else content,
+            'found_words': [item['Word'] for item in result],
+            'original_content': content
+        }
+    except Exception as e:
+        print(f"valx过滤失败，使用自动机实现: {e}")
+        return None
+
+
 def check_sensitive_content(content):
     """检查内容是否包含敏感词"""
     if not content:
@@ -52,54 +450,95 @@ def check_sensitive_content(content):
             'found_words': [],
             'original_content': content
         }
-    
-    if valx_available:
-        # 使用valx检查敏感词
-        try:
-            # 使用valx的detect_profanity函数
-            text_data = [content]
-            result = valx.detect_profanity(text_data, custom_words_list=chinese_sensitive_words)
-            
-            if result:
-                # 获取找到的敏感词
-                found_words = [item['Word'] for item in result]
-                # 使用valx的remove_profanity函数过滤内容
-                filtered_data = valx.remove_profanity(text_data, custom_words_list=chinese_sensitive_words)
-                filtered_content = filtered_data[0] if filtered_data else content
-                
-                return {
-                    'is_safe': False,
-                    'filtered_content': filtered_content,
-                    'found_words': found_words,
-                    'original_content': content
-                }
-            else:
-                return {
-                    'is_safe': True,
-                    'filtered_content': content,
-                    'found_words': [],
-                    'original_content': content
-                }
-        except Exception as e:
-            print(f"valx过滤失败，使用自定义实现: {e}")
-            # 如果valx失败，回退到自定义实现
-            pass
-    
-    # 自定义敏感词检查实现
-    found_words = []
-    filtered_content = content
-    
-    for word in chinese_sensitive_words:
-        if word in content:
-            found_words.append(word)
-            filtered_content = filtered_content.replace(word, '*' * len(word))
-    
-    return {
-        'is_safe': len(found_words) == 0,
-        'filtered_content': filtered_content,
-        'found_words': found_words,
-        'original_content': content
-    }
+
+    cache_key = None
+    if len(content) <= MODERATION_CACHE_MAX_LEN:
+        digest = hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+        cache_key = (sensitive_words_version, digest)
+        cached = moderation_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached, found_words=list(cached['found_words']))
+
+    result = None
+    # 默认使用自动机；设置 SENSITIVE_FILTER_ENGINE=valx 可切回 valx
+    if SENSITIVE_FILTER_ENGINE == 'valx':
+        result = _check_with_valx(content)
+    if result is None:
+        result = sensitive_matcher.check(content)
+
+    if cache_key is not None:
+        moderation_cache.set(cache_key, dict(result, found_words=list(result['found_words'])))
+    return result
+
+
+_moderation_pool = None
+_moderation_pool_lock = threading.Lock()
+
+
+def _init_moderation_worker(words):
+    """进程池 worker 初始化：按父进程当前词表构建匹配器"""
+    global sensitive_matcher
+    sensitive_matcher = SensitiveWordMatcher(words, normalize=SENSITIVE_NORMALIZE)
+
+
+def _check_sensitive_chunk(contents):
+    return [check_sensitive_content(content) for content in contents]
+
+
+def _get_moderation_pool():
+    global _moderation_pool
+    with _moderation_pool_lock:
+        if _moderation_pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            _moderation_pool = ProcessPoolExecutor(
+                max_workers=MODERATION_POOL_WORKERS,
+                initializer=_init_moderation_worker,
+                initargs=(list(chinese_sensitive_words),),
+            )
+        return _moderation_pool
+
+
+def _reset_moderation_pool():
+    """词表变更后换用新进程池，旧池在后台线程里跑完已提交的任务再关闭
+
+    正在消费旧池结果的 check_sensitive_content_many 仍按旧词表拿到完整结果，
+    不会因为任务被取消而中途报错。
+    """
+    global _moderation_pool
+    with _moderation_pool_lock:
+        pool, _moderation_pool = _moderation_pool, None
+    if pool is not None:
+        threading.Thread(target=pool.shutdown, kwargs={"wait": True}, daemon=True).start()
+
+
+def shutdown_moderation_pool():
+    """等待在途任务完成后关闭审核进程池，供脚本退出前调用"""
+    global _moderation_pool
+    with _moderation_pool_lock:
+        pool, _moderation_pool = _moderation_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def check_sensitive_content_many(contents):
+    """批量检查敏感词，按输入顺序逐条产出结果
+
+    小批量直接在当前进程里逐条检查；超过 MODERATION_POOL_THRESHOLD 条时
+    分块分发到进程池，块按顺序完成即可开始产出，调用方可以边拿边写出。
+    """
+    contents = list(contents)
+    if len(contents) < MODERATION_POOL_THRESHOLD or MODERATION_POOL_WORKERS <= 1:
+        for content in contents:
+            yield check_sensitive_content(content)
+        return
+
+    chunks = [
+        contents[i:i + MODERATION_CHUNK_SIZE]
+        for i in range(0, len(contents), MODERATION_CHUNK_SIZE)
+    ]
+    for results in _get_moderation_pool().map(_check_sensitive_chunk, chunks):
+        yield from results
 
 # 角色常量
 ROLES = {
@@ -113,25 +552,102 @@ def has_role(user, role):
     """检查用户是否具有指定角色"""
     return user and user.user_type == role
 
+def _is_sqlite_file(url):
+    return url.startswith("sqlite:") and ":memory:" not in url and url.rstrip("/") != "sqlite:"
+
+
+def _engine_options(url):
+    """连接池配置：SQLite 文件库允许跨线程使用连接，等锁时间与 busy_timeout 一致"""
+    if url.startswith("sqlite:") and not _is_sqlite_file(url):
+        return {}  # 内存库由 SQLAlchemy 选用单连接池
+    options = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+    if _is_sqlite_file(url):
+        options["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    else:
+        options["pool_pre_ping"] = True
+    return options
+
+
+class RoutingSession(FlaskSQLAlchemySession):
+    """把只读请求的查询路由到只读副本的会话
+
+    只有 read_replica 标记过的请求才会用副本，同一请求固定使用同一个副本。
+    flush、非 SELECT 语句以及本会话写过数据之后的查询一律走主库，保证读到
+    自己刚写入的内容。
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None and self.info.get("read_replica") and not self.info.get("wrote")
+            and not self._flushing and getattr(clause, "is_select", False)
+        ):
+            engine = self.info.get("replica_engine")
+            if engine is None:
+                engine = self.info["replica_engine"] = replica_router.pick() or False
+            if engine:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
 def create_app() -> Flask:
     app = Flask(__name__)
 
     app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv(
         "DATABASE_URL", "sqlite:///neighbor_app.db"
     )
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = _engine_options(app.config["SQLALCHEMY_DATABASE_URI"])
+    # 只读副本使用 replica0、replica1... 作为 bind key，没有模型绑定到它们，只由 RoutingSession 选用
+    app.config["SQLALCHEMY_BINDS"] = {
+        f"replica{index}": dict(_engine_options(url), url=url) for index, url in enumerate(DATABASE_REPLICA_URLS)
+    }
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "change-this-in-prod")
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=24)
+    app.config["BCRYPT_LOG_ROUNDS"] = BCRYPT_LOG_ROUNDS
 
-    CORS(app)
+    # 分页游标等自定义响应头需要显式暴露给浏览器
+    CORS(app, expose_headers=["X-Next-Cursor", "ETag", "X-DB-Query-Count", "X-DB-Time-Ms"])
     return app
 
 
 app = create_app()
 bcrypt = Bcrypt(app)
-db = SQLAlchemy(app)
+db = SQLAlchemy(app, session_options={"class_": RoutingSession})
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """每个新连接上设置的 PRAGMA
+
+    - WAL：读不阻塞写、写不阻塞读，Socket.IO 写消息时 HTTP 读请求照常进行
+    - synchronous=NORMAL：WAL 下只在检查点时 fsync，断电最多丢最近的事务，不会损坏库
+    - busy_timeout：遇到写锁时等待而不是立即报 database is locked
+    - cache_size/mmap_size：加大页缓存并用内存映射读，减少 read() 系统调用
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        if SQLITE_PROFILE == "production":
+            cursor.execute("PRAGMA journal_mode = WAL")
+            cursor.execute("PRAGMA synchronous = NORMAL")
+            cursor.execute(f"PRAGMA cache_size = {-SQLITE_CACHE_SIZE_KB}")
+            cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+            cursor.execute("PRAGMA temp_store = MEMORY")
+    finally:
+        cursor.close()
+
+
+with app.app_context():
+    for bind_engine in db.engines.values():
+        if _is_sqlite_file(str(bind_engine.url)):
+            event.listen(bind_engine, "connect", _apply_sqlite_pragmas)
 jwt = JWTManager(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# 多进程部署（含 celery 审核 worker）时通过 SOCKETIO_MESSAGE_QUEUE 共享广播
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode='threading',
+    message_queue=os.getenv("SOCKETIO_MESSAGE_QUEUE"),
+)
 
 
 class TimestampMixin:
@@ -143,6 +659,14 @@ class TimestampMixin:
 
 class User(db.Model, TimestampMixin):
     __tablename__ = "users"
+    __table_args__ = (
+        db.Index("ix_users_real_name", "real_name"),
+        db.Index("ix_users_credit_points", "credit_points"),
+        # 按手机号后四位查找用户
+        db.Index("ix_users_phone_suffix", db.func.substr(db.literal_column("phone"), -4)),
+        # 用户名/真实姓名不区分大小写的前缀搜索
+        db.Index("ix_users_username_lower", db.func.lower(db.literal_column("username"))),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -172,15 +696,27 @@ class User(db.Model, TimestampMixin):
 
 class Post(db.Model, TimestampMixin):
     __tablename__ = "posts"
+    __table_args__ = (
+        db.Index("ix_posts_created", "created_at", "id"),
+        db.Index("ix_posts_user_created", "user_id", "created_at"),
+        db.Index("ix_posts_group_created", "group_id", "created_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     content = db.Column(db.Text, nullable=False)
     image_url = db.Column(db.String(255))
     post_type = db.Column(db.String(32), default="normal")  # normal/activity/help
+    moderation_status = db.Column(db.String(32), default="published", nullable=False)  # pending_review/published/masked
+    group_id = db.Column(db.Integer, db.ForeignKey("groups.id"))  # 发布到小组时设置
+    fanned_out = db.Column(db.Boolean, default=True, nullable=False)  # False 表示受众过大，读时拉取
 
     author = db.relationship("User", backref=db.backref("posts", lazy=True))
 
+    projection_columns = (
+        "id", "user_id", "content", "image_url", "post_type", "moderation_status", "group_id", "created_at",
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -188,12 +724,17 @@ class Post(db.Model, TimestampMixin):
             "content": self.content,
             "image_url": self.image_url,
             "post_type": self.post_type,
+            "group_id": self.group_id,
+            "moderation_status": self.moderation_status,
             "created_at": self.created_at.isoformat(),
         }
 
 
 class Group(db.Model, TimestampMixin):
     __tablename__ = "groups"
+    __table_args__ = (
+        db.Index("ix_groups_created", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), unique=True, nullable=False)
@@ -212,6 +753,10 @@ class Group(db.Model, TimestampMixin):
 
 class GroupMember(db.Model, TimestampMixin):
     __tablename__ = "group_members"
+    __table_args__ = (
+        db.Index("uq_group_members_group_user", "group_id", "user_id", unique=True),
+        db.Index("ix_group_members_user", "user_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     group_id = db.Column(db.Integer, db.ForeignKey("groups.id"), nullable=False)
@@ -221,8 +766,25 @@ class GroupMember(db.Model, TimestampMixin):
     user = db.relationship("User", backref=db.backref("group_memberships", lazy=True))
 
 
+class TimelineEntry(db.Model):
+    """首页时间线：动态发布时写入作者、好友和所在小组成员的时间线"""
+    __tablename__ = "timeline_entries"
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "post_id", name="uq_timeline_user_post"),
+        db.Index("ix_timeline_user_created", "user_id", "created_at", "post_id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    post_id = db.Column(db.Integer, db.ForeignKey("posts.id"), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)  # 冗余动态的发布时间，用于排序翻页
+
+
 class Activity(db.Model, TimestampMixin):
     __tablename__ = "activities"
+    __table_args__ = (
+        db.Index("ix_activities_created", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -251,6 +813,9 @@ class Activity(db.Model, TimestampMixin):
 
 class Task(db.Model, TimestampMixin):
     __tablename__ = "tasks"
+    __table_args__ = (
+        db.Index("ix_tasks_created", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -300,6 +865,10 @@ class Announcement(db.Model, TimestampMixin):
 
 class PointTransaction(db.Model, TimestampMixin):
     __tablename__ = "point_transactions"
+    __table_args__ = (
+        db.Index("ix_point_transactions_to_user_created", "to_user_id", "created_at"),
+        db.Index("ix_point_transactions_from_user_created", "from_user_id", "created_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     from_user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
@@ -331,6 +900,8 @@ class ChatRoom(db.Model, TimestampMixin):
     room_type = db.Column(db.String(32), default="group")  # group/private
     created_by = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     is_active = db.Column(db.Boolean, default=True, nullable=False)
+    # 房间内最后分配的消息发布序号，见 _assign_chat_publish_seq
+    published_seq = db.Column(db.Integer, default=0, nullable=False)
 
     creator = db.relationship("User", backref=db.backref("created_rooms", lazy=True))
 
@@ -348,12 +919,18 @@ class ChatRoom(db.Model, TimestampMixin):
 
 class ChatMember(db.Model, TimestampMixin):
     __tablename__ = "chat_members"
+    __table_args__ = (
+        db.Index("uq_chat_members_room_user", "room_id", "user_id", unique=True),
+        db.Index("ix_chat_members_user", "user_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey("chat_rooms.id"), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     role = db.Column(db.String(32), default="member")  # owner/admin/member
     joined_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # 已读水位：该成员读到的消息发布序号，之后发布的别人的消息都算未读；NULL 视为 0
+    last_read_seq = db.Column(db.Integer)
 
     room = db.relationship("ChatRoom", backref=db.backref("members", lazy=True))
     user = db.relationship("User", backref=db.backref("chat_memberships", lazy=True))
@@ -365,11 +942,17 @@ class ChatMember(db.Model, TimestampMixin):
             "user_id": self.user_id,
             "role": self.role,
             "joined_at": self.joined_at.isoformat(),
+            "last_read_seq": self.last_read_seq,
         }
 
 
 class ChatMessage(db.Model, TimestampMixin):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        db.Index("ix_chat_messages_room_created", "room_id", "created_at"),
+        # 聊天室列表按发布序号取每个房间的最后一条消息、按已读水位统计未读数
+        db.Index("ix_chat_messages_room_seq", "room_id", "published_seq"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey("chat_rooms.id"), nullable=False)
@@ -377,10 +960,18 @@ class ChatMessage(db.Model, TimestampMixin):
     content = db.Column(db.Text, nullable=False)
     message_type = db.Column(db.String(32), default="text")  # text/image/file/system
     is_read = db.Column(db.Boolean, default=False, nullable=False)
+    moderation_status = db.Column(db.String(32), default="published", nullable=False)  # pending_review/published/masked
+    # 房间内的发布序号，待审消息为 NULL；审核有先后，id 小的消息可能更晚发布，未读按它而不是 id 计算
+    published_seq = db.Column(db.Integer)
 
     room = db.relationship("ChatRoom", backref=db.backref("messages", lazy=True))
     sender = db.relationship("User", backref=db.backref("sent_messages", lazy=True))
 
+    projection_columns = (
+        "id", "room_id", "sender_id", "content", "message_type", "is_read", "moderation_status", "published_seq",
+        "created_at",
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -389,12 +980,18 @@ class ChatMessage(db.Model, TimestampMixin):
             "content": self.content,
             "message_type": self.message_type,
             "is_read": self.is_read,
+            "moderation_status": self.moderation_status,
+            "published_seq": self.published_seq,
             "created_at": self.created_at.isoformat(),
         }
 
 
 class Friendship(db.Model, TimestampMixin):
     __tablename__ = "friendships"
+    __table_args__ = (
+        db.Index("ix_friendships_user_friend_status", "user_id", "friend_id", "status"),
+        db.Index("ix_friendships_friend_status", "friend_id", "status"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -421,6 +1018,9 @@ class Friendship(db.Model, TimestampMixin):
 # 1. 实时通知系统
 class Notification(db.Model, TimestampMixin):
     __tablename__ = "notifications"
+    __table_args__ = (
+        db.Index("ix_notifications_user_read_created", "user_id", "is_read", "created_at"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -432,6 +1032,10 @@ class Notification(db.Model, TimestampMixin):
     
     user = db.relationship("User", backref=db.backref("notifications", lazy=True))
     
+    projection_columns = (
+        "id", "user_id", "title", "content", "notification_type", "is_read", "related_url", "created_at",
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -447,6 +1051,9 @@ class Notification(db.Model, TimestampMixin):
 # 2. 本地商家地图
 class Business(db.Model, TimestampMixin):
     __tablename__ = "businesses"
+    __table_args__ = (
+        db.Index("ix_businesses_created", "created_at", "id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -527,6 +1134,10 @@ class Coupon(db.Model, TimestampMixin):
 
 class UserCoupon(db.Model, TimestampMixin):
     __tablename__ = "user_coupons"
+    __table_args__ = (
+        db.Index("uq_user_coupons_coupon_user", "coupon_id", "user_id", unique=True),
+        db.Index("ix_user_coupons_user", "user_id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -579,6 +1190,9 @@ class Poll(db.Model, TimestampMixin):
 
 class PollVote(db.Model, TimestampMixin):
     __tablename__ = "poll_votes"
+    __table_args__ = (
+        db.Index("uq_poll_votes_poll_user", "poll_id", "user_id", unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     poll_id = db.Column(db.Integer, db.ForeignKey("polls.id"), nullable=False)
@@ -600,6 +1214,9 @@ class PollVote(db.Model, TimestampMixin):
 # 5. 图片分享墙
 class Photo(db.Model, TimestampMixin):
     __tablename__ = "photos"
+    __table_args__ = (
+        db.Index("ix_photos_created", "created_at", "id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -632,6 +1249,9 @@ class Photo(db.Model, TimestampMixin):
 # 6. 事件日历
 class Event(db.Model, TimestampMixin):
     __tablename__ = "events"
+    __table_args__ = (
+        db.Index("ix_events_start", "start_time", "id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -651,6 +1271,12 @@ class Event(db.Model, TimestampMixin):
     
     creator = db.relationship("User", backref=db.backref("created_events", lazy=True))
     
+    projection_columns = (
+        "id", "title", "description", "event_type", "start_time", "end_time", "location", "latitude",
+        "longitude", "max_participants", "current_participants", "created_by", "is_public", "is_recurring",
+        "recurrence_rule", "created_at",
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -673,6 +1299,9 @@ class Event(db.Model, TimestampMixin):
 
 class EventParticipant(db.Model, TimestampMixin):
     __tablename__ = "event_participants"
+    __table_args__ = (
+        db.Index("uq_event_participants_event_user", "event_id", "user_id", unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     event_id = db.Column(db.Integer, db.ForeignKey("events.id"), nullable=False)
@@ -694,6 +1323,9 @@ class EventParticipant(db.Model, TimestampMixin):
 # 7. 二手交易平台
 class MarketplaceItem(db.Model, TimestampMixin):
     __tablename__ = "marketplace_items"
+    __table_args__ = (
+        db.Index("ix_marketplace_items_created", "created_at", "id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -711,6 +1343,11 @@ class MarketplaceItem(db.Model, TimestampMixin):
     
     seller = db.relationship("User", backref=db.backref("marketplace_items", lazy=True))
     
+    projection_columns = (
+        "id", "title", "description", "category", "price", "original_price", "condition", "images",
+        "seller_id", "is_sold", "is_negotiable", "location", "contact_phone", "created_at",
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -732,6 +1369,9 @@ class MarketplaceItem(db.Model, TimestampMixin):
 # 8. 技能交换系统
 class Skill(db.Model, TimestampMixin):
     __tablename__ = "skills"
+    __table_args__ = (
+        db.Index("ix_skills_created", "created_at", "id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -793,6 +1433,9 @@ class SkillRequest(db.Model, TimestampMixin):
 # 9. 社区统计仪表板
 class UserActivity(db.Model, TimestampMixin):
     __tablename__ = "user_activities"
+    __table_args__ = (
+        db.Index("ix_user_activities_created", "created_at"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -847,6 +1490,9 @@ class Quest(db.Model, TimestampMixin):
 
 class UserQuest(db.Model, TimestampMixin):
     __tablename__ = "user_quests"
+    __table_args__ = (
+        db.Index("ix_user_quests_user_quest", "user_id", "quest_id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -875,6 +1521,11 @@ class UserQuest(db.Model, TimestampMixin):
 
 class Image(db.Model, TimestampMixin):
     __tablename__ = "images"
+    __table_args__ = (
+        db.Index("ix_images_public_created", "is_public", "created_at"),
+        db.Index("ix_images_public_likes", "is_public", "likes"),
+        db.Index("ix_images_user", "user_id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -888,7 +1539,17 @@ class Image(db.Model, TimestampMixin):
     is_public = db.Column(db.Boolean, default=True, nullable=False)
     
     user = db.relationship("User", backref=db.backref("images", lazy=True))
+
+    @property
+    def username(self):
+        return self.user.username if self.user else None
     
+    # username 由调用方 JOIN 带出
+    projection_columns = (
+        "id", "user_id", "title", "description", "url", "thumbnail_url", "tags", "likes", "comments_count",
+        "is_public", "created_at",
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -901,7 +1562,7 @@ class Image(db.Model, TimestampMixin):
             "likes": self.likes,
             "comments_count": self.comments_count,
             "is_public": self.is_public,
-            "username": self.user.username if self.user else None,
+            "username": self.username,
             "user_avatar": None,  # TODO: Add avatar field to User model
             "liked": False,  # TODO: Check if current user liked
             "comments": [],  # TODO: Load comments
@@ -911,6 +1572,9 @@ class Image(db.Model, TimestampMixin):
 
 class ImageLike(db.Model, TimestampMixin):
     __tablename__ = "image_likes"
+    __table_args__ = (
+        db.Index("uq_image_likes_image_user", "image_id", "user_id", unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     image_id = db.Column(db.Integer, db.ForeignKey("images.id"), nullable=False)
@@ -930,6 +1594,9 @@ class ImageLike(db.Model, TimestampMixin):
 
 class ImageComment(db.Model, TimestampMixin):
     __tablename__ = "image_comments"
+    __table_args__ = (
+        db.Index("ix_image_comments_image_id", "image_id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     image_id = db.Column(db.Integer, db.ForeignKey("images.id"), nullable=False)
@@ -938,14 +1605,21 @@ class ImageComment(db.Model, TimestampMixin):
     
     image = db.relationship("Image", backref=db.backref("comments_rel", lazy=True))
     user = db.relationship("User", backref=db.backref("image_comments", lazy=True))
+
+    @property
+    def username(self):
+        return self.user.username if self.user else None
     
+    # username 由调用方 JOIN 带出
+    projection_columns = ("id", "image_id", "user_id", "comment", "created_at")
+
     def to_dict(self):
         return {
             "id": self.id,
             "image_id": self.image_id,
             "user_id": self.user_id,
             "comment": self.comment,
-            "username": self.user.username if self.user else None,
+            "username": self.username,
             "user_avatar": None,  # TODO: Add avatar field to User model
             "created_at": self.created_at.isoformat(),
         }
@@ -1036,6 +1710,9 @@ class Lottery(db.Model, TimestampMixin):
 
 class LotteryEntry(db.Model, TimestampMixin):
     __tablename__ = "lottery_entries"
+    __table_args__ = (
+        db.Index("uq_lottery_entries_lottery_user", "lottery_id", "user_id", unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     lottery_id = db.Column(db.Integer, db.ForeignKey("lotteries.id"), nullable=False)
@@ -1086,6 +1763,9 @@ class Achievement(db.Model, TimestampMixin):
 
 class UserAchievement(db.Model, TimestampMixin):
     __tablename__ = "user_achievements"
+    __table_args__ = (
+        db.Index("ix_user_achievements_user", "user_id", "achievement_id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -1107,6 +1787,9 @@ class UserAchievement(db.Model, TimestampMixin):
 # 13. 社区问答系统
 class Question(db.Model, TimestampMixin):
     __tablename__ = "questions"
+    __table_args__ = (
+        db.Index("ix_questions_created", "created_at", "id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -1121,6 +1804,11 @@ class Question(db.Model, TimestampMixin):
     
     user = db.relationship("User", backref=db.backref("questions", lazy=True))
     
+    projection_columns = (
+        "id", "title", "content", "category", "tags", "user_id", "views_count", "answers_count", "is_solved",
+        "best_answer_id", "created_at",
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -1138,6 +1826,9 @@ class Question(db.Model, TimestampMixin):
 
 class Answer(db.Model, TimestampMixin):
     __tablename__ = "answers"
+    __table_args__ = (
+        db.Index("ix_answers_question_created", "question_id", "created_at"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     question_id = db.Column(db.Integer, db.ForeignKey("questions.id"), nullable=False)
@@ -1145,10 +1836,16 @@ class Answer(db.Model, TimestampMixin):
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     is_best = db.Column(db.Boolean, default=False, nullable=False)
     likes_count = db.Column(db.Integer, default=0)
+    moderation_status = db.Column(db.String(32), default="published", nullable=False)  # pending_review/published/masked
     
     question = db.relationship("Question", backref=db.backref("answers", lazy=True))
     user = db.relationship("User", backref=db.backref("answers", lazy=True))
     
+    projection_columns = (
+        "id", "question_id", "content", "user_id", "is_best", "likes_count", "moderation_status",
+        "created_at",
+    )
+
     def to_dict(self):
         return {
             "id": self.id,
@@ -1157,12 +1854,16 @@ class Answer(db.Model, TimestampMixin):
             "user_id": self.user_id,
             "is_best": self.is_best,
             "likes_count": self.likes_count,
+            "moderation_status": self.moderation_status,
             "created_at": self.created_at.isoformat(),
         }
 
 # 14. 社区活动签到系统
 class EventCheckIn(db.Model, TimestampMixin):
     __tablename__ = "event_checkins"
+    __table_args__ = (
+        db.Index("ix_event_checkins_event_user", "event_id", "user_id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     event_id = db.Column(db.Integer, db.ForeignKey("events.id"), nullable=False)
@@ -1188,97 +1889,1827 @@ class EventCheckIn(db.Model, TimestampMixin):
         }
 
 
-def award_points(user: User, amount: int, description: str, from_user: Optional[User] = None):
-    if amount == 0:
-        return
-    user.credit_points = (user.credit_points or 0) + amount
-    txn = PointTransaction(
-        from_user_id=from_user.id if from_user else None,
-        to_user_id=user.id,
-        amount=amount,
-        description=description,
-    )
-    db.session.add(txn)
+class SensitiveWord(db.Model, TimestampMixin):
+    __tablename__ = "sensitive_words"
+
+    id = db.Column(db.Integer, primary_key=True)
+    word = db.Column(db.String(100), unique=True, nullable=False)
+    created_by = db.Column(db.Integer, db.ForeignKey("users.id"))
+
+
+class SensitiveWordVersion(db.Model):
+    """词库版本号，只有 id=1 一行，每次增删敏感词加一"""
+    __tablename__ = "sensitive_word_versions"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class TableVersion(db.Model):
+    """被 conditional_get/cached_response 依赖的表每张一行的变更版本号，表内数据每次提交变更加一"""
+    __tablename__ = "table_versions"
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SchemaMigration(db.Model):
+    """已执行的数据库迁移，每个版本一行"""
+    __tablename__ = "schema_migrations"
+
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(255), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+# ==================== 敏感词词库同步 ====================
+
+class LocalDictionaryBus:
+    """进程内的词库变更通知，单进程部署和测试使用"""
+
+    def __init__(self):
+        self._listeners = []
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def publish(self, version):
+        for callback in list(self._listeners):
+            callback(version)
+
+
+class RedisDictionaryBus:
+    """通过 redis pub/sub 通知其它 worker 词库已变更"""
+
+    channel = "nearus:sensitive_words"
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+
+    def subscribe(self, callback):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: lambda message: callback(int(message["data"]))})
+        pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def publish(self, version):
+        self._client.publish(self.channel, version)
+
+
+def _create_dictionary_bus():
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        try:
+            bus = RedisDictionaryBus(redis_url)
+            bus.subscribe(_on_dictionary_changed)
+            return bus
+        except Exception as e:
+            print(f"redis词库通知不可用，仅依赖轮询: {e}")
+    bus = LocalDictionaryBus()
+    bus.subscribe(_on_dictionary_changed)
+    return bus
+
+
+# 下一次查询词库版本的时间；收到变更通知时置 0 让下个请求立即同步
+_dictionary_next_poll = 0.0
+
+
+def _on_dictionary_changed(version):
+    global _dictionary_next_poll
+    if version != sensitive_words_version:
+        _dictionary_next_poll = 0.0
+
+
+dictionary_bus = _create_dictionary_bus()
+
+
+def sync_sensitive_words(force=False):
+    """版本号变化时从词库表重新加载敏感词并重建匹配器
+
+    平时只做一次时间比较；到了轮询时间才查一次版本行，版本未变不做任何事。
+    需要在应用上下文中调用。
+    """
+    global _dictionary_next_poll
+    now = time.monotonic()
+    if not force and now < _dictionary_next_poll:
+        return False
+    _dictionary_next_poll = now + SENSITIVE_WORDS_POLL_INTERVAL
+
+    try:
+        row = db.session.get(SensitiveWordVersion, 1)
+        if row is None or row.version == sensitive_words_version:
+            return False
+        version = row.version
+        words = [word for (word,) in db.session.query(SensitiveWord.word).order_by(SensitiveWord.id)]
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        print(f"敏感词词库同步失败，继续使用本地词表: {e}")
+        return False
+
+    chinese_sensitive_words[:] = words
+    rebuild_sensitive_matcher(version)
+    return True
+
+
+def _bump_sensitive_words_version():
+    """在当前事务中把词库版本加一，返回新版本号"""
+    SensitiveWordVersion.query.filter_by(id=1).update(
+        {SensitiveWordVersion.version: SensitiveWordVersion.version + 1,
+         SensitiveWordVersion.updated_at: datetime.utcnow()},
+        synchronize_session=False,
+    )
+    return db.session.query(SensitiveWordVersion.version).filter_by(id=1).scalar()
+
+
+def seed_sensitive_words():
+    """词库版本行不存在时写入内置敏感词列表"""
+    if db.session.get(SensitiveWordVersion, 1) is not None:
+        return
+    for word in dict.fromkeys(chinese_sensitive_words):
+        db.session.add(SensitiveWord(word=word))
+    db.session.add(SensitiveWordVersion(id=1, version=sensitive_words_version))
+    db.session.commit()
+
+
+@app.before_request
+def _sync_sensitive_words_before_request():
+    sync_sensitive_words()
+
+
+# ==================== 首页时间线 ====================
+
+def _friend_ids_query(user_id):
+    """已互为好友的用户 id 子查询"""
+    return db.session.query(
+        db.case((Friendship.user_id == user_id, Friendship.friend_id), else_=Friendship.user_id)
+    ).filter(
+        or_(Friendship.user_id == user_id, Friendship.friend_id == user_id),
+        Friendship.status == "accepted",
+    )
+
+
+def timeline_audiences(posts, executor=None):
+    """一批动态各自的受众：作者本人、作者的好友、动态所属小组的成员
+
+    posts 只需要 id、user_id、group_id 三个属性；好友和小组成员各用一次查询
+    批量取出，返回 {post_id: 受众 user_id 集合}。executor 默认为 db.session，
+    迁移里传入连接。
+    """
+    executor = executor if executor is not None else db.session
+    author_ids = {post.user_id for post in posts}
+    group_ids = {post.group_id for post in posts if post.group_id}
+
+    friends = defaultdict(set)
+    for user_id, friend_id in executor.execute(
+        db.select(Friendship.user_id, Friendship.friend_id).where(
+            or_(Friendship.user_id.in_(author_ids), Friendship.friend_id.in_(author_ids)),
+            Friendship.status == "accepted",
+        )
+    ):
+        friends[user_id].add(friend_id)
+        friends[friend_id].add(user_id)
+
+    members = defaultdict(set)
+    if group_ids:
+        for group_id, user_id in executor.execute(
+            db.select(GroupMember.group_id, GroupMember.user_id).where(GroupMember.group_id.in_(group_ids))
+        ):
+            members[group_id].add(user_id)
+
+    return {
+        post.id: {post.user_id} | friends[post.user_id] | (members[post.group_id] if post.group_id else set())
+        for post in posts
+    }
+
+
+def _timeline_rows(posts, audiences):
+    """按受众生成时间线行，返回 (行列表, 受众过大需改为读时拉取的动态 id 列表)"""
+    rows = []
+    pulled_ids = []
+    for post in posts:
+        audience = audiences[post.id]
+        if len(audience) > TIMELINE_FANOUT_LIMIT:
+            pulled_ids.append(post.id)
+            audience = {post.user_id}
+        rows.extend({"user_id": user_id, "post_id": post.id, "created_at": post.created_at} for user_id in audience)
+    return rows, pulled_ids
+
+
+def fan_out_posts(posts):
+    """写扩散：把一批动态写入各自受众的时间线，不提交事务
+
+    受众超过 TIMELINE_FANOUT_LIMIT 时只写作者自己的时间线，并把动态标记为
+    fanned_out=False，由读取方按好友/小组关系拉取。
+    """
+    if not posts:
+        return
+    rows, pulled_ids = _timeline_rows(posts, timeline_audiences(posts))
+    pulled_ids = set(pulled_ids)
+    for post in posts:
+        if post.id in pulled_ids:
+            post.fanned_out = False
+    db.session.execute(insert(TimelineEntry), rows)
+
+
+def backfill_timeline(user_id, author_id=None, group_id=None):
+    """新加好友或加入小组后，把对方或小组最近 TIMELINE_BACKFILL_LIMIT 条已扩散的动态补进
+    该用户的时间线，不提交事务。未扩散的动态读取时按关系拉取，不需要补。"""
+    source = db.select(db.literal(user_id), Post.id, Post.created_at).where(
+        Post.fanned_out == True,
+        Post.moderation_status != "pending_review",
+        Post.user_id == author_id if author_id is not None else Post.group_id == group_id,
+    ).order_by(Post.created_at.desc()).limit(TIMELINE_BACKFILL_LIMIT)
+    db.session.execute(
+        insert(TimelineEntry).from_select(["user_id", "post_id", "created_at"], source)
+        .prefix_with("OR IGNORE", dialect="sqlite")
+    )
+
+
+def read_timeline(user_id, limit, cursor=None):
+    """读取时间线的一页，返回 (动态列表, 下一页游标)
+
+    写扩散的部分直接按 (created_at, post_id) 走索引取一页；受众过大而未扩散
+    的动态按好友/小组关系读时拉取，再与前者合并。两边各取 limit+1 行即可。
+    """
+    position = decode_cursor(cursor) if cursor else None
+
+    entries = db.session.query(TimelineEntry.created_at, TimelineEntry.post_id).filter(
+        TimelineEntry.user_id == user_id
+    )
+    if position:
+        entries = entries.filter(tuple_(TimelineEntry.created_at, TimelineEntry.post_id) < tuple_(*position))
+    keys = entries.order_by(
+        TimelineEntry.created_at.desc(), TimelineEntry.post_id.desc()
+    ).limit(limit + 1).all()
+
+    my_groups = db.session.query(GroupMember.group_id).filter(GroupMember.user_id == user_id)
+    pulled = db.session.query(Post.created_at, Post.id).filter(
+        Post.fanned_out == False,
+        Post.moderation_status != "pending_review",
+        or_(Post.user_id.in_(_friend_ids_query(user_id)), Post.group_id.in_(my_groups)),
+    )
+    if position:
+        pulled = pulled.filter(tuple_(Post.created_at, Post.id) < tuple_(*position))
+    keys += pulled.order_by(Post.created_at.desc(), Post.id.desc()).limit(limit + 1).all()
+
+    keys = sorted(set(map(tuple, keys)), reverse=True)
+    next_cursor = encode_cursor(*keys[limit - 1]) if len(keys) > limit else None
+    keys = keys[:limit]
+
+    posts_by_id = {post.id: post for post in Post.query.filter(Post.id.in_([post_id for _, post_id in keys]))}
+    return [posts_by_id[post_id] for _, post_id in keys if post_id in posts_by_id], next_cursor
+
+
+# ==================== 全文搜索 ====================
+
+# 类型 -> (模型, 标题字段, 正文字段, 类型编码)；索引行的 rowid = id * 8 + 类型编码
+SEARCHABLE_MODELS = {
+    "post": (Post, None, "content", 1),
+    "question": (Question, "title", "content", 2),
+    "answer": (Answer, None, "content", 3),
+    "marketplace": (MarketplaceItem, "title", "description", 4),
+}
+SEARCH_KIND_BY_MODEL = {spec[0]: kind for kind, spec in SEARCHABLE_MODELS.items()}
+
+# None 表示本进程还没检查过；SQLite 未编译 FTS5 或使用其它数据库时为 False
+search_index_ready = None
+
+_SEARCH_TOKEN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9a-z]+")
+
+
+def _is_cjk(ch):
+    return not ch.isascii()
+
+
+def search_tokens(content, for_query=False):
+    """把文本切成 FTS5 词元：中文按相邻两字切成二元组，英文数字按单词
+
+    先按敏感词同一张表归一化（全角转半角、大写转小写、繁体转简体）。建索引
+    时每段中文额外收录末尾单字，这样单字查询可以用前缀匹配二元组和末字。
+    """
+    tokens = []
+    for run in _SEARCH_TOKEN_RE.findall((content or "").translate(SENSITIVE_NORMALIZE_TABLE)):
+        if not _is_cjk(run[0]) or len(run) == 1:
+            tokens.append(run)
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        if not for_query:
+            tokens.append(run[-1])
+    return tokens
+
+
+def build_search_match(query_text):
+    """把用户输入转成 FTS5 MATCH 表达式，各词元之间为 AND；没有可用词元时返回 None"""
+    terms = []
+    for token in search_tokens(query_text, for_query=True):
+        # 单字和英文词用前缀匹配，支持边输边搜
+        prefix = len(token) == 1 or not _is_cjk(token[0])
+        terms.append(f'"{token}"*' if prefix else f'"{token}"')
+    return " ".join(terms) or None
+
+
+def _search_index_row(kind, item):
+    model, title_field, body_field, code = SEARCHABLE_MODELS[kind]
+    title = getattr(item, title_field) if title_field else ""
+    return {
+        "rowid": item.id * 8 + code,
+        "title": " ".join(search_tokens(title)),
+        "body": " ".join(search_tokens(getattr(item, body_field))),
+        "kind": kind,
+    }
+
+
+def _is_searchable(item):
+    # 待审核的内容不进索引，审核通过后状态变化会触发重新索引
+    return getattr(item, "moderation_status", "published") != "pending_review"
+
+
+_SEARCH_DELETE_SQL = text("DELETE FROM search_index WHERE rowid = :rowid")
+_SEARCH_INSERT_SQL = text("INSERT INTO search_index (rowid, title, body, kind) VALUES (:rowid, :title, :body, :kind)")
+
+
+@event.listens_for(db.session, "after_flush")
+def _sync_search_index(session, flush_context):
+    """在写入所在的事务里增量更新索引：先删旧行，再插入仍可搜索的新内容"""
+    if search_index_ready is False:
+        return
+    changed = list(session.new) + [obj for obj in session.dirty if session.is_modified(obj)]
+    deletes = []
+    inserts = []
+    for obj in changed + list(session.deleted):
+        kind = SEARCH_KIND_BY_MODEL.get(type(obj))
+        if kind is None:
+            continue
+        deletes.append({"rowid": obj.id * 8 + SEARCHABLE_MODELS[kind][3]})
+        if obj not in session.deleted and _is_searchable(obj):
+            inserts.append(_search_index_row(kind, obj))
+    if not deletes or not _search_index_exists(session):
+        return
+    connection = session.connection()
+    if deletes:
+        connection.execute(_SEARCH_DELETE_SQL, deletes)
+    if inserts:
+        connection.execute(_SEARCH_INSERT_SQL, inserts)
+
+
+def rebuild_search_index():
+    """清空并按现有数据重建索引，返回写入的行数"""
+    db.session.execute(text("DELETE FROM search_index"))
+    total = 0
+    for kind, (model, title_field, body_field, _) in SEARCHABLE_MODELS.items():
+        columns = [model.id, getattr(model, body_field)]
+        if title_field:
+            columns.append(getattr(model, title_field))
+        query = db.session.query(*columns)
+        if hasattr(model, "moderation_status"):
+            query = query.filter(model.moderation_status != "pending_review")
+        batch = []
+        for row in query.yield_per(SEARCH_REBUILD_BATCH_SIZE):
+            batch.append(_search_index_row(kind, row))
+            if len(batch) >= SEARCH_REBUILD_BATCH_SIZE:
+                db.session.execute(_SEARCH_INSERT_SQL, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(_SEARCH_INSERT_SQL, batch)
+            total += len(batch)
+    db.session.commit()
+    return total
+
+
+def _search_index_exists(session):
+    """Celery 审核任务、脚本等不经过 HTTP 请求的写入不会触发 before_request，
+    索引状态未知时在当前事务的连接上检查一次索引表是否已建好"""
+    global search_index_ready
+    if search_index_ready is None and db.engine.dialect.name == "sqlite":
+        if session.connection().execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+        )).first() is not None:
+            search_index_ready = True
+    return bool(search_index_ready)
+
+
+def ensure_search_index():
+    """创建 FTS5 虚拟表；首次创建时用现有数据回填"""
+    global search_index_ready
+    if db.engine.dialect.name != "sqlite":
+        print("全文搜索需要 SQLite FTS5，当前数据库不支持")
+        search_index_ready = False
+        return False
+    try:
+        with db.engine.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+            )).first() is not None
+            if not exists:
+                conn.execute(text(
+                    "CREATE VIRTUAL TABLE search_index USING fts5("
+                    "title, body, kind UNINDEXED, tokenize = 'unicode61 remove_diacritics 0')"
+                ))
+    except OperationalError as e:
+        print(f"全文搜索不可用: {e}")
+        search_index_ready = False
+        return False
+    search_index_ready = True
+    if not exists:
+        rebuild_search_index()
+    return True
+
+
+@app.before_request
+def _ensure_search_index_before_request():
+    if search_index_ready is None:
+        ensure_search_index()
+    if user_search_index_ready is None:
+        ensure_user_search_index()
+
+
+def search_content(query_text, kinds, limit, cursor=None):
+    """按 bm25 相关度（标题权重更高）排序的全文搜索，返回 ([(类型, id, 得分)], 下一页游标)
+
+    游标是上一页最后一条的 (得分, rowid)，翻页条件与其它列表一样是组合比较。
+    """
+    match = build_search_match(query_text)
+    if match is None:
+        return [], None
+    params = {"match": match, "limit": limit + 1}
+    kind_filter = ", ".join(f":kind{i}" for i in range(len(kinds)))
+    params.update({f"kind{i}": kind for i, kind in enumerate(kinds)})
+    after = ""
+    if cursor:
+        params["after_score"], params["after_rowid"] = decode_cursor(cursor)
+        after = "WHERE score > :after_score OR (score = :after_score AND rid > :after_rowid)"
+    rows = db.session.execute(text(f"""
+        SELECT rid, kind, score FROM (
+            SELECT rowid AS rid, kind, bm25(search_index, 2.0, 1.0) AS score
+            FROM search_index
+            WHERE search_index MATCH :match AND kind IN ({kind_filter})
+        ) {after}
+        ORDER BY score, rid
+        LIMIT :limit
+    """), params).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].score, rows[-1].rid)
+    return [(row.kind, row.rid // 8, row.score) for row in rows], next_cursor
+
+
+# ==================== 用户搜索 ====================
+
+# 用户名/真实姓名的 trigram 索引（SQLite 3.34+），以 users 为外部内容表，由触发器同步，
+# 批量导入等绕过 ORM 的写入也能覆盖
+user_search_index_ready = None
+
+USER_SEARCH_INDEX_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_search_index USING fts5("
+    "username, real_name, content='users', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS users_search_ai AFTER INSERT ON users BEGIN "
+    "INSERT INTO user_search_index(rowid, username, real_name) VALUES (new.id, new.username, new.real_name); END",
+    "CREATE TRIGGER IF NOT EXISTS users_search_ad AFTER DELETE ON users BEGIN "
+    "INSERT INTO user_search_index(user_search_index, rowid, username, real_name) "
+    "VALUES ('delete', old.id, old.username, old.real_name); END",
+    "CREATE TRIGGER IF NOT EXISTS users_search_au AFTER UPDATE OF username, real_name ON users BEGIN "
+    "INSERT INTO user_search_index(user_search_index, rowid, username, real_name) "
+    "VALUES ('delete', old.id, old.username, old.real_name); "
+    "INSERT INTO user_search_index(rowid, username, real_name) VALUES (new.id, new.username, new.real_name); END",
+)
+
+
+def ensure_user_search_index():
+    """创建用户 trigram 索引和同步触发器；首次创建时从 users 重建"""
+    global user_search_index_ready
+    if db.engine.dialect.name != "sqlite":
+        user_search_index_ready = False
+        return False
+    try:
+        with db.engine.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_search_index'"
+            )).first() is not None
+            for ddl in USER_SEARCH_INDEX_DDL:
+                conn.execute(text(ddl))
+            if not exists:
+                conn.execute(text("INSERT INTO user_search_index(user_search_index) VALUES ('rebuild')"))
+    except OperationalError as e:
+        print(f"用户搜索索引不可用，退化为全表扫描: {e}")
+        user_search_index_ready = False
+        return False
+    user_search_index_ready = True
+    return True
+
+
+def _prefix_range(expr, prefix):
+    """expr 以 prefix 开头的范围条件，可以走 expr 上的索引
+
+    SQLite 按 UTF-8 字节比较文本，顺序与码位一致；上界把 prefix 末字符换成
+    下一个码位（跳过代理区），末字符已是最大码位时去掉它再进位。
+    """
+    conditions = [expr >= prefix]
+    head = prefix
+    while head and ord(head[-1]) == sys.maxunicode:
+        head = head[:-1]
+    if head:
+        code = ord(head[-1]) + 1
+        if 0xD800 <= code <= 0xDFFF:
+            code = 0xE000
+        conditions.append(expr < head[:-1] + chr(code))
+    return conditions
+
+
+def search_user_ids(query_text, exclude_id, limit):
+    """按用户名、真实姓名、手机号后四位查找用户，返回按匹配程度排好序的 id
+
+    - 纯数字且为 4 位：走手机号后四位表达式索引
+    - 不少于 3 个字符：trigram 索引做子串匹配；常见子串可能命中大量用户，
+      按相关度排序要给全部命中打分，所以只取前几条，不排序
+    - 更短的输入：trigram 索引查不了 1～2 个字符，对 lower(用户名/真实姓名)
+      逐行 instr 做子串匹配，凑够 limit 条就停止扫描；用 instr 而不用 LIKE，
+      输入里的 % 和 _ 不用转义
+    用户名前缀命中的结果始终排在最前，走 lower(username) 表达式索引范围扫描；
+    匹配都不区分大小写。
+    """
+    ids = []
+
+    def add(rows):
+        for (user_id,) in rows:
+            if user_id != exclude_id and user_id not in ids:
+                ids.append(user_id)
+
+    # SQLite 的 lower() 只转换 ASCII 字母，这里保持一致，否则非 ASCII 大写字母永远比不上
+    lowered = "".join(ch.lower() if ch.isascii() else ch for ch in query_text)
+    username = db.func.lower(User.username)
+    add(db.session.query(User.id).filter(
+        *_prefix_range(username, lowered)
+    ).order_by(username).limit(limit + 1))
+    if len(ids) < limit and query_text.isdigit() and len(query_text) == 4:
+        # -4 必须以字面量出现，与索引表达式完全一致，绑定参数会让 SQLite 认不出索引
+        suffix = db.func.substr(User.phone, db.literal_column("-4"))
+        add(db.session.query(User.id).filter(suffix == query_text).limit(limit + 1))
+    if len(ids) < limit:
+        if len(query_text) >= 3 and user_search_index_ready:
+            phrase = '"' + query_text.replace('"', '""') + '"'
+            add(db.session.execute(text(
+                "SELECT rowid FROM user_search_index WHERE user_search_index MATCH :q LIMIT :limit"
+            ), {"q": phrase, "limit": limit + 1}))
+        elif len(query_text) >= 3:
+            add(db.session.query(User.id).filter(
+                or_(User.username.contains(query_text), User.real_name.contains(query_text))
+            ).limit(limit + 1))
+        else:
+            add(db.session.query(User.id).filter(or_(
+                db.func.instr(username, lowered) > 0, db.func.instr(db.func.lower(User.real_name), lowered) > 0
+            )).limit(limit + 1))
+    return ids[:limit]
+
+
+def friendship_statuses(user_id, other_ids):
+    """一次查询取回 user_id 与一批用户之间的好友关系状态，没有关系的不在结果里"""
+    if not other_ids:
+        return {}
+    rows = db.session.query(Friendship.user_id, Friendship.friend_id, Friendship.status).filter(
+        or_(
+            (Friendship.user_id == user_id) & Friendship.friend_id.in_(other_ids),
+            (Friendship.friend_id == user_id) & Friendship.user_id.in_(other_ids),
+        )
+    ).order_by(Friendship.id)
+    statuses = {}
+    for requester_id, friend_id, status in rows:
+        other_id = friend_id if requester_id == user_id else requester_id
+        statuses.setdefault(other_id, status)
+    return statuses
+
+
+# ==================== 异步内容审核 ====================
+
+MODERATED_MODELS = {
+    "post": Post,
+    "answer": Answer,
+    "chat_message": ChatMessage,
+}
+
+
+def _publish_moderated(kind, item):
+    """审核完成后的发布动作"""
+    if kind == "chat_message":
+        socketio.emit('new_message', {
+            'id': item.id,
+            'content': item.content,
+            'sender_id': item.sender_id,
+            'moderation_status': item.moderation_status,
+            'created_at': item.created_at.isoformat()
+        }, room=str(item.room_id))
+
+
+def moderate_items(kind, ids):
+    """批量审核一组待审内容：安全的直接发布，命中敏感词的打码后发布
+
+    需要在应用上下文中调用。
+    """
+    model = MODERATED_MODELS[kind]
+    sync_sensitive_words()
+    items = model.query.filter(
+        model.id.in_(ids), model.moderation_status == "pending_review"
+    ).all()
+    if not items:
+        return 0
+    results = check_sensitive_content_many([item.content for item in items])
+    for item, result in zip(items, results):
+        if result['is_safe']:
+            item.moderation_status = "published"
+        else:
+            item.content = result['filtered_content']
+            item.moderation_status = "masked"
+    if kind == "post":
+        fan_out_posts(items)
+    db.session.commit()
+    for item in items:
+        _publish_moderated(kind, item)
+    return len(items)
+
+
+class ModerationQueue:
+    """进程内的审核队列
+
+    请求线程只负责入队；后台线程攒够 MODERATION_QUEUE_BATCH_SIZE 条或等待
+    MODERATION_QUEUE_FLUSH_INTERVAL 秒后按类型成批审核。配置了 celery 时，
+    攒好的批次交给 celery worker 执行，否则在本进程线程里执行。
+    """
+
+    def __init__(self, batch_size, flush_interval, workers):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, kind, item_id):
+        self._ensure_started()
+        self._queue.put((kind, item_id))
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"moderation-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            grouped = {}
+            for kind, item_id in self._next_batch():
+                grouped.setdefault(kind, []).append(item_id)
+            for kind, ids in grouped.items():
+                try:
+                    self._dispatch(kind, ids)
+                except Exception as e:
+                    print(f"内容审核失败({kind}, {len(ids)}条): {e}")
+
+    def _dispatch(self, kind, ids):
+        if celery_app is not None:
+            moderate_batch_task.delay(kind, ids)
+            return
+        with app.app_context():
+            try:
+                moderate_items(kind, ids)
+            except Exception:
+                db.session.rollback()
+                raise
+
+
+moderation_queue = ModerationQueue(
+    MODERATION_QUEUE_BATCH_SIZE, MODERATION_QUEUE_FLUSH_INTERVAL, MODERATION_QUEUE_WORKERS
+)
+
+celery_app = None
+if CELERY_BROKER_URL:
+    from celery import Celery
+
+    celery_app = Celery("nearus", broker=CELERY_BROKER_URL)
+
+    @celery_app.task(name="nearus.moderate_batch")
+    def moderate_batch_task(kind, ids):
+        with app.app_context():
+            if search_index_ready is None:
+                ensure_search_index()  # worker 进程没有 before_request，发布的内容才能进索引
+            return moderate_items(kind, ids)
+
+
+def requeue_pending_moderation():
+    """进程重启后把仍处于 pending_review 的内容重新放回审核队列"""
+    for kind, model in MODERATED_MODELS.items():
+        pending = db.session.query(model.id).filter(model.moderation_status == "pending_review")
+        for (item_id,) in pending:
+            moderation_queue.submit(kind, item_id)
+
+
+def award_points(user: User, amount: int, description: str, from_user: Optional[User] = None):
+    if amount == 0:
+        return
+    user.credit_points = (user.credit_points or 0) + amount
+    txn = PointTransaction(
+        from_user_id=from_user.id if from_user else None,
+        to_user_id=user.id,
+        amount=amount,
+        description=description,
+    )
+    db.session.add(txn)
+
+
+def require_admin(user: User):
+    if user.user_type != "admin":
+        return jsonify({"error": "需要管理员权限"}), 403
+    return None
+
+
+# ==================== 单写线程成组提交 ====================
+
+class WritePipelineBusy(Exception):
+    """写入在 WRITE_PIPELINE_TIMEOUT 秒内没有等到提交结果"""
+
+
+class _PendingWrite:
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class WritePipeline:
+    """把小写操作集中到一个写线程成组提交
+
+    SQLite 同一时刻只有一个写事务，每个点赞/投票各自 commit 就各付一次 fsync。
+    开启后请求线程把写函数入队并阻塞等待；写线程攒够 batch_size 个或等待
+    flush_interval 秒后，在同一个事务里依次执行，整组提交一次，再把各自的
+    返回值或异常交还调用方。组内有写函数失败时整组重做，每个写函数包在
+    SAVEPOINT 里，失败只回滚它自己，因此写函数要能安全地重复执行。
+
+    写函数只接收 id 等普通参数，在 db.session 上读写但不 commit，返回值应是
+    普通数据（需要自增 id 时先 flush）。未开启时直接在调用方的会话里执行并提交。
+    等待超时抛出 WritePipelineBusy，此时写入仍可能在稍后提交。
+    """
+
+    def __init__(self, enabled, batch_size, flush_interval, timeout):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.groups = 0
+        self.writes = 0
+
+    def run(self, fn, *args):
+        if not self.enabled:
+            try:
+                result = fn(*args)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            return result
+        self._ensure_started()
+        pending = _PendingWrite(fn, args)
+        self._queue.put(pending)
+        if not pending.done.wait(self.timeout):
+            raise WritePipelineBusy()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "groups": self.groups,
+            "writes": self.writes,
+            "avg_group_size": round(self.writes / self.groups, 2) if self.groups else 0,
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                thread = threading.Thread(target=self._run, name="write-pipeline", daemon=True)
+                thread.start()
+                self._thread = thread
+
+    def _next_group(self):
+        group = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(group) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # 截止后仍把已经排队的写入一并带上
+                group.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return group
+
+    def _run(self):
+        while True:
+            group = self._next_group()
+            try:
+                with app.app_context():
+                    self._commit_group(group)
+            except Exception as e:
+                for pending in group:
+                    if pending.error is None:
+                        pending.result, pending.error = None, e
+            self.groups += 1
+            self.writes += len(group)
+            for pending in group:
+                pending.done.set()
+
+    def _commit_group(self, group):
+        # 先整组直接执行；有写函数失败时回滚整组，再逐个包在 SAVEPOINT 里重做
+        session = db.session
+        self._begin(session)
+        try:
+            for pending in group:
+                pending.result = pending.fn(*pending.args)
+            session.flush()
+        except Exception:
+            session.rollback()
+            self._begin(session)
+            for pending in group:
+                try:
+                    with session.begin_nested():
+                        pending.result = pending.fn(*pending.args)
+                except Exception as e:
+                    pending.result, pending.error = None, e
+        try:
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+    @staticmethod
+    def _begin(session):
+        if db.engine.dialect.name == "sqlite":
+            # pysqlite 不会在 SAVEPOINT 之前发出 BEGIN，第一个 SAVEPOINT 会自己开启事务、
+            # RELEASE 时就提交；先显式开启写事务，保证整组只在最后提交一次
+            session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+
+write_pipeline = WritePipeline(
+    WRITE_PIPELINE_ENABLED, WRITE_PIPELINE_BATCH_SIZE, WRITE_PIPELINE_FLUSH_INTERVAL, WRITE_PIPELINE_TIMEOUT
+)
+
+
+@app.errorhandler(WritePipelineBusy)
+def _handle_write_pipeline_busy(e):
+    return jsonify({"error": "服务繁忙，请稍后重试"}), 503
+
+
+# ==================== 游标分页 ====================
+
+class InvalidCursor(ValueError):
+    """客户端传入的分页游标无法解析"""
+
+
+@app.errorhandler(InvalidCursor)
+def _handle_invalid_cursor(e):
+    return jsonify({"error": "cursor 无效"}), 400
+
+
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, row_id = json.loads(raw)
+        # 时间排序键编码为 ISO 字符串，相关度等数值排序键原样保存
+        if isinstance(sort_value, str):
+            sort_value = datetime.fromisoformat(sort_value)
+        elif not isinstance(sort_value, (int, float)) or isinstance(sort_value, bool):
+            raise ValueError(sort_value)
+        return sort_value, int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def page_limit():
+    try:
+        limit = int(request.args.get("limit", PAGE_DEFAULT_LIMIT))
+    except ValueError:
+        limit = PAGE_DEFAULT_LIMIT
+    return max(1, min(limit, PAGE_MAX_LIMIT))
+
+
+def paginate_keyset(query, sort_column, id_column, descending=True):
+    """按 (sort_column, id) 做键集分页，返回 (本页记录, 下一页游标)
+
+    游标是对上一页最后一行 (sort_value, id) 的不透明编码，翻页条件直接走
+    组合比较，不需要 OFFSET 扫描；多取一行用来判断是否还有下一页。
+    """
+    limit = page_limit()
+    cursor = request.args.get("cursor")
+    if cursor:
+        key = tuple_(sort_column, id_column)
+        position = tuple_(*decode_cursor(cursor))
+        query = query.filter(key < position if descending else key > position)
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    items = query.limit(limit + 1).all()
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    last = items[-1]
+    return items, encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+
+def paginated_response(rows, next_cursor):
+    """列表仍以 JSON 数组返回，下一页游标只放在 X-Next-Cursor 响应头
+
+    响应体里没有游标字段，最后一页不带这个头。客户端把头里的值原样作为
+    cursor 参数请求下一页（前端见 fetchPage）；CORS 和响应缓存都保留了这个头。
+    """
+    response = jsonify(rows)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
+# ==================== 投影读取 ====================
+
+_to_dict_columns = {}
+
+
+def to_dict_columns(model):
+    """模型 projection_columns 声明的列对象"""
+    columns = _to_dict_columns.get(model)
+    if columns is None:
+        columns = tuple(model.__table__.columns[name] for name in model.projection_columns)
+        _to_dict_columns[model] = columns
+    return columns
+
+
+def projection_query(model, *extra_columns):
+    """只查询模型 projection_columns 的查询，结果是轻量的 Row 元组
+
+    projection_columns 是模型上声明的列名元组：to_dict 读取的本表字段都必须
+    列在其中，漏列会在序列化 Row 时抛 AttributeError。
+
+    Row 不进入会话的 identity map，也没有属性插桩和状态跟踪；它同样支持按
+    列名取属性，所以可以直接交给 model.to_dict 序列化（见 rows_to_dicts）。
+    to_dict 读取的其它字段（如作者用户名）要通过 extra_columns 带出。
+    """
+    return db.session.query(*to_dict_columns(model), *extra_columns)
+
+
+def rows_to_dicts(model, rows):
+    to_dict = model.to_dict
+    return [to_dict(row) for row in rows]
+
+
+def _dump_json_bytes(row):
+    if orjson is not None:
+        return orjson.dumps(row)
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def stream_json_array(rows, chunk_size=JSON_STREAM_CHUNK_SIZE):
+    """把可迭代的 dict 按块编码成一个 JSON 数组，以分块传输流式返回
+
+    rows 应是惰性的（如 query.yield_per() 上的生成器），这样任何时刻内存里
+    只有一块行数据，峰值内存与结果总量无关。响应头发出后出错只能中断连接，
+    客户端会收到不完整的 JSON。
+    """
+    def generate():
+        yield b"["
+        separator = b""
+        chunk = []
+        for row in rows:
+            chunk.append(_dump_json_bytes(row))
+            if len(chunk) >= chunk_size:
+                yield separator + b",".join(chunk)
+                separator = b","
+                chunk = []
+        if chunk:
+            yield separator + b",".join(chunk)
+        yield b"]"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+@app.route("/")
+def index():
+    return jsonify({
+        "message": "邻里APP后端API", 
+        "version": "1.0.0",
+        "endpoints": {
+            "health": "/health",
+            "auth": "/auth/login, /auth/register",
+            "users": "/users/me",
+            "posts": "/posts",
+            "groups": "/groups", 
+            "activities": "/activities",
+            "tasks": "/tasks",
+            "announcements": "/announcements",
+            "points": "/points/transfer",
+            "demo": "/demo/bootstrap"
+        }
+    })
+
+@app.route("/health")
+def health():
+    return jsonify({"status": "ok", "time": datetime.utcnow().isoformat()})
+
+
+@app.route("/auth/register", methods=["POST"])
+def register():
+    data = request.get_json() or {}
+    username = (data.get("username") or "").strip()
+    password = (data.get("password") or "").strip()
+    phone = (data.get("phone") or "").strip()
+    email = (data.get("email") or "").strip() or None
+    real_name = (data.get("real_name") or "").strip() or None
+    if not username or not password or not phone:
+        return jsonify({"error": "username、password、phone 必填"}), 400
+
+    if User.query.filter((User.username == username) | (User.phone == phone)).first():
+        return jsonify({"error": "用户名或手机号已存在"}), 400
+
+    try:
+        pw_hash = password_hasher.hash(password)
+    except PasswordHasherBusy:
+        return jsonify({"error": "服务繁忙，请稍后重试"}), 503
+    user = User(
+        username=username,
+        password_hash=pw_hash,
+        phone=phone,
+        email=email,
+        real_name=real_name,
+        interest_tags=json.dumps(data.get("interest_tags") or []),
+        is_verified=True,
+    )
+    db.session.add(user)
+    db.session.flush()
+    award_points(user, 50, "注册奖励积分")
+    db.session.commit()
+
+    token = create_access_token(identity=str(user.id), expires_delta=timedelta(days=7))
+    return jsonify({"access_token": token, "user": user.to_dict()})
+
+
+@app.route("/auth/login", methods=["POST"])
+def login():
+    data = request.get_json() or {}
+    username = (data.get("username") or "").strip()
+    password = (data.get("password") or "").strip()
+    user = User.query.filter_by(username=username).first()
+    try:
+        if not user or not password_hasher.check(user.password_hash, password):
+            return jsonify({"error": "用户名或密码错误"}), 401
+        # bcrypt 代价调整后，用户下次登录时透明地升级哈希
+        if password_hasher.needs_rehash(user.password_hash):
+            user.password_hash = password_hasher.hash(password)
+            db.session.commit()
+    except PasswordHasherBusy:
+        return jsonify({"error": "服务繁忙，请稍后重试"}), 503
+    token = create_access_token(identity=str(user.id), expires_delta=timedelta(days=7))
+    return jsonify({"access_token": token, "user": user.to_dict()})
+
+
+user_identity_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+user_lookup_stats = {"request_memo_hits": 0, "db_loads": 0}
+
+
+def _detached_user_copy(user: User) -> User:
+    """复制一份不属于任何会话的 User，作为跨请求缓存的快照"""
+    snapshot = User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+# ==================== 密码哈希 ====================
+
+def _bcrypt_hash_password(password, rounds):
+    import bcrypt as bcrypt_lib
+
+    # bcrypt 只使用前 72 字节，显式截断以兼容新版 bcrypt 对超长密码的报错
+    return bcrypt_lib.hashpw(password.encode("utf-8")[:72], bcrypt_lib.gensalt(rounds)).decode("utf-8")
+
+
+def _bcrypt_check_password(pw_hash, password):
+    import bcrypt as bcrypt_lib
+
+    try:
+        return bcrypt_lib.checkpw(password.encode("utf-8")[:72], pw_hash.encode("utf-8"))
+    except ValueError:
+        return False
+
+
+class PasswordHasherBusy(Exception):
+    """排队中的哈希任务已达上限"""
+
+
+class PasswordHasher:
+    """在独立进程池中计算 bcrypt，避免占用请求线程和 GIL
+
+    同时在途的任务数由 PASSWORD_HASH_MAX_PENDING 限制，排队超过
+    PASSWORD_HASH_QUEUE_TIMEOUT 秒仍拿不到名额时抛出 PasswordHasherBusy。
+    workers=0 时直接在调用线程里计算。
+    """
+
+    def __init__(self, rounds, workers, max_pending, queue_timeout):
+        self.rounds = rounds
+        self.workers = workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                from concurrent.futures import ProcessPoolExecutor
+
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def shutdown(self):
+        """等待在途任务完成后关闭进程池，之后再调用会重新创建"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy()
+        try:
+            return self._get_pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(_bcrypt_hash_password, password, self.rounds)
+
+    def check(self, pw_hash, password):
+        return self._run(_bcrypt_check_password, pw_hash, password)
+
+    def hash_many(self, passwords):
+        """并行计算一批密码哈希，整批只占用一个排队名额"""
+        if self.workers <= 0:
+            return [_bcrypt_hash_password(password, self.rounds) for password in passwords]
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy()
+        try:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            return list(self._get_pool().map(
+                _bcrypt_hash_password, passwords, [self.rounds] * len(passwords), chunksize=chunksize
+            ))
+        finally:
+            self._slots.release()
+
+    def needs_rehash(self, pw_hash):
+        """哈希里的代价与当前配置不一致时需要重新计算，格式为 $2b$<cost>$..."""
+        parts = pw_hash.split("$")
+        return len(parts) < 4 or not parts[2].isdigit() or int(parts[2]) != self.rounds
+
+
+password_hasher = PasswordHasher(
+    BCRYPT_LOG_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_QUEUE_TIMEOUT
+)
+
+
+def current_user() -> User:
+    """当前登录用户
+
+    同一请求内只查一次；GET/HEAD 请求还会使用短 TTL 的跨请求快照，通过
+    merge(load=False) 挂到当前会话上，不产生数据库往返。写请求总是读库，
+    避免基于旧积分做读改写。
+    """
+    if "current_user" in g:
+        user_lookup_stats["request_memo_hits"] += 1
+        return g.current_user
+
+    user_id = int(get_jwt_identity())
+    user = None
+    use_cache = USER_CACHE_TTL > 0 and request.method in ("GET", "HEAD")
+    if use_cache:
+        snapshot = user_identity_cache.get(user_id)
+        if snapshot is not None:
+            user = db.session.merge(snapshot, load=False)
+    if user is None:
+        user = User.query.get(user_id)
+        user_lookup_stats["db_loads"] += 1
+        if user is not None and USER_CACHE_TTL > 0:
+            user_identity_cache.set(user_id, _detached_user_copy(user))
+    g.current_user = user
+    return user
+
+
+@event.listens_for(db.session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault("changed_user_ids", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            changed.add(obj.id)
+
+
+@event.listens_for(db.session, "after_commit")
+def _invalidate_changed_users(session):
+    # me() PATCH、award_points、transfer_points 等对 User 的修改都会经过这里
+    for user_id in session.info.pop("changed_user_ids", ()):
+        user_identity_cache.delete(user_id)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_changed_users(session):
+    session.info.pop("changed_user_ids", None)
+
+
+# ==================== 表变更版本与条件请求 ====================
+
+# conditional_get/cached_response 依赖的表，在装饰路由时登记；只有这些表的写入才更新版本号，
+# 其余表（聊天消息、点赞、通知等）的写入不再多一次 table_versions 更新
+VERSIONED_TABLES = set()
+
+
+def _bump_table_versions(connection, table_names):
+    """在当前事务里给这些表的版本号加一，和数据变更一起提交或回滚"""
+    table = TableVersion.__table__
+    now = datetime.utcnow()
+    for name in sorted(table_names):  # 固定加锁顺序
+        result = connection.execute(
+            table.update().where(table.c.table_name == name).values(version=table.c.version + 1, updated_at=now)
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(table_name=name, version=1, updated_at=now))
+
+
+@event.listens_for(db.session, "after_flush")
+def _bump_flushed_table_versions(session, flush_context):
+    changed = {obj.__table__.name for obj in list(session.new) + list(session.deleted)}
+    changed.update(obj.__table__.name for obj in session.dirty if session.is_modified(obj))
+    changed &= VERSIONED_TABLES
+    if changed:
+        _bump_table_versions(session.connection(), changed)
+        session.info.setdefault("changed_tables", set()).update(changed)
+
+
+@event.listens_for(db.session, "do_orm_execute")
+def _bump_bulk_table_versions(orm_execute_state):
+    # insert(Model)、Query.update()/delete() 等批量语句不经过 flush，在这里单独记一次
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.local_table.name in VERSIONED_TABLES:
+        _bump_table_versions(orm_execute_state.session.connection(), {mapper.local_table.name})
+        orm_execute_state.session.info.setdefault("changed_tables", set()).add(mapper.local_table.name)
+
+
+def seed_table_versions():
+    """为登记过的表补齐版本行，避免首次写入时再插入"""
+    existing = {name for (name,) in db.session.query(TableVersion.table_name)}
+    for name in sorted(VERSIONED_TABLES):
+        if name not in existing:
+            db.session.add(TableVersion(table_name=name, version=0))
+    db.session.commit()
+
+
+def conditional_get(*table_names):
+    """列表接口的条件请求：ETag/Last-Modified 由依赖表的版本号生成
+
+    客户端带 If-None-Match / If-Modified-Since 且数据未变时直接返回 304，
+    不执行列表查询也不做序列化。版本号在查询之前读取，并发写入只会让
+    ETag 偏旧，导致下次多拉一次，不会把新数据标成旧版本。
+    """
+    VERSIONED_TABLES.update(table_names)
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return fn(*args, **kwargs)
+            rows = db.session.query(TableVersion.table_name, TableVersion.version, TableVersion.updated_at).filter(
+                TableVersion.table_name.in_(table_names)
+            ).all()
+            digest = hashlib.blake2b(request.full_path.encode("utf-8"), digest_size=16)
+            for name, version, _ in sorted(rows):
+                digest.update(f"|{name}:{version}".encode("utf-8"))
+            etag = digest.hexdigest()
+            last_modified = max((updated_at for _, _, updated_at in rows), default=None)
+            if last_modified is not None:
+                last_modified = last_modified.replace(microsecond=0)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = (
+                    since is not None and last_modified is not None
+                    and last_modified <= since.replace(tzinfo=None)
+                )
+            if not_modified:
+                response = Response(status=304)
+            else:
+                response = app.make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True  # 允许缓存，但每次都要回源校验
+            return response
+        return wrapper
+    return decorator
+
+
+# ==================== 只读副本路由 ====================
+
+class ReplicaRouter:
+    """只读副本的选择与延迟检测
+
+    延迟用 table_versions 里最新的 updated_at 衡量：主库最近一次提交的变更时间
+    减去副本上能看到的最近变更时间，两边数据一致时为 0。只有 VERSIONED_TABLES
+    里的表会更新版本号，其它表的写入不计入延迟。每隔 check_interval 秒
+    由某个请求线程顺带检查一次，延迟超过 max_lag 或连不上的副本暂停使用，
+    没有可用副本时回退到主库。
+    """
+
+    def __init__(self, bind_keys, max_lag, check_interval):
+        self.bind_keys = bind_keys
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag = {key: None for key in bind_keys}
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def pick(self):
+        if not self.bind_keys:
+            return None
+        self._refresh()
+        usable = [key for key in self.bind_keys if self.lag[key] is not None and self.lag[key] <= self.max_lag]
+        if not usable:
+            return None
+        self._counter += 1
+        return db.engines[usable[self._counter % len(usable)]]
+
+    def _refresh(self):
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        if not self._lock.acquire(blocking=False):
+            return  # 其它线程正在检查，沿用上一次的结果
+        try:
+            try:
+                primary = self._latest_change(db.engine)
+            except SQLAlchemyError as e:
+                print(f"检查主库变更时间失败: {e}")
+                primary = None
+            for key in self.bind_keys:
+                try:
+                    replica = self._latest_change(db.engines[key])
+                except SQLAlchemyError as e:
+                    print(f"只读副本 {key} 不可用: {e}")
+                    self.lag[key] = None
+                    continue
+                if primary is None or (replica is not None and replica >= primary):
+                    self.lag[key] = 0.0
+                else:
+                    self.lag[key] = (primary - replica).total_seconds() if replica is not None else float("inf")
+            self._checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _latest_change(engine):
+        with engine.connect() as conn:
+            return conn.execute(db.select(db.func.max(TableVersion.updated_at))).scalar()
+
+
+replica_router = ReplicaRouter(
+    [f"replica{index}" for index in range(len(DATABASE_REPLICA_URLS))],
+    REPLICA_MAX_LAG_SECONDS, REPLICA_LAG_CHECK_INTERVAL,
+)
+
+
+def read_replica(fn):
+    """只读 GET 接口：本次请求的查询优先走只读副本，未配置副本时不生效"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if request.method in ("GET", "HEAD"):
+            db.session.info["read_replica"] = True
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+@event.listens_for(db.session, "after_flush")
+def _mark_session_wrote(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(db.session, "do_orm_execute")
+def _mark_bulk_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+# ==================== 请求级 SQL 统计 ====================
+
+class RepeatedQueryError(AssertionError):
+    """测试模式下同一条 SELECT 在一个请求里执行次数超过 QUERY_REPEAT_LIMIT"""
+
+
+_IN_LIST_RE = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+
+
+def _statement_shape(statement):
+    # IN 列表展开后占位符个数随参数变化，归并成同一种语句
+    return _IN_LIST_RE.sub("(?)", statement)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_request_query(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+    if not QUERY_STATS_ENABLED or not has_request_context():
+        return
+    stats = g.get("query_stats")
+    if stats is None:
+        stats = g.query_stats = {"count": 0, "seconds": 0.0, "selects": Counter()}
+    stats["count"] += 1
+    if statement.lstrip()[:6].upper() != "SELECT":
+        return
+    shape = _statement_shape(statement)
+    stats["selects"][shape] += 1
+    if stats["selects"][shape] == QUERY_REPEAT_LIMIT + 1:
+        message = (
+            f"{request.method} {request.path} 中同一语句执行超过 {QUERY_REPEAT_LIMIT} 次，"
+            f"疑似 N+1 查询: {' '.join(shape.split())[:300]}"
+        )
+        if app.testing:
+            raise RepeatedQueryError(message)
+        print(message)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _time_request_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    in_request = has_request_context()
+    if in_request and "query_stats" in g:
+        g.query_stats["seconds"] += elapsed
+    if SLOW_QUERY_THRESHOLD_MS > 0 and elapsed * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+        try:
+            slow_query_log.record(conn, cursor, statement, parameters, executemany, elapsed, in_request)
+        except Exception as e:  # 记录慢查询失败不能影响业务语句
+            print(f"写入慢查询日志失败: {e}")
+
+
+@app.after_request
+def _report_query_stats(response):
+    if not QUERY_STATS_ENABLED:
+        return response
+    stats = g.pop("query_stats", None)
+    count, elapsed_ms = (stats["count"], stats["seconds"] * 1000) if stats else (0, 0.0)
+    response.headers["X-DB-Query-Count"] = str(count)
+    response.headers["X-DB-Time-Ms"] = f"{elapsed_ms:.1f}"
+    if count >= QUERY_STATS_LOG_MIN:
+        print(f"[sql] {request.method} {request.path} {response.status_code} 查询 {count} 次，耗时 {elapsed_ms:.1f}ms")
+    return response
+
+
+# ==================== 慢查询日志 ====================
+
+class SlowQueryLog:
+    """慢查询 JSONL 日志
+
+    每条记录包含耗时、语句、归一化后的语句形态、绑定参数、所在路由（后台
+    线程记线程名）和 EXPLAIN QUERY PLAN。EXPLAIN 用同一个 DBAPI 连接上的新
+    游标执行，不经过 SQLAlchemy 事件。文件按大小轮转，保留 backups 个旧文件；
+    轮转不跨进程加锁，多 worker 部署时请给每个进程配置不同的路径。
+    """
+
+    def __init__(self, path, max_bytes, backups):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._logger = None
+        self._lock = threading.Lock()
+
+    def _get_logger(self):
+        with self._lock:
+            if self._logger is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                handler = RotatingFileHandler(
+                    self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding="utf-8"
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger = logging.getLogger("nearus.slow_query")
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                logger.addHandler(handler)
+                self._logger = logger
+            return self._logger
+
+    def record(self, conn, cursor, statement, parameters, executemany, elapsed, in_request):
+        entry = {
+            "time": datetime.utcnow().isoformat(),
+            "duration_ms": round(elapsed * 1000, 2),
+            "shape": " ".join(_statement_shape(statement).split()),
+            "statement": statement,
+            "parameters": _loggable_parameters(parameters, executemany),
+            "route": (
+                f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+                if in_request else f"thread:{threading.current_thread().name}"
+            ),
+            "plan": None if executemany else self._explain(conn, cursor, statement, parameters),
+        }
+        self._get_logger().info(json.dumps(entry, ensure_ascii=False, default=str))
+
+    @staticmethod
+    def _explain(conn, cursor, statement, parameters):
+        head = statement.lstrip()[:6].upper()
+        if head not in ("SELECT", "UPDATE", "DELETE", "INSERT"):
+            return None
+        sqlite = conn.dialect.name == "sqlite"
+        explain_cursor = cursor.connection.cursor()
+        try:
+            explain_cursor.execute(("EXPLAIN QUERY PLAN " if sqlite else "EXPLAIN ") + statement, parameters)
+            # SQLite 每行最后一列是计划说明，其它数据库保留整行
+            return [str(row[-1]) if sqlite else " | ".join(map(str, row)) for row in explain_cursor.fetchall()]
+        finally:
+            explain_cursor.close()
+
+    def read(self):
+        """按时间先后读出当前文件和轮转出去的旧文件里的全部记录"""
+        paths = [f"{self.path}.{index}" for index in range(self.backups, 0, -1)] + [self.path]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # 轮转或写入中途截断的行
+
+
+def _loggable_parameters(parameters, executemany):
+    if executemany:
+        return {"executemany": len(parameters)}
+    if isinstance(parameters, dict):
+        return {key: _loggable_value(value) for key, value in parameters.items()}
+    return [_loggable_value(value) for value in parameters or ()]
+
+
+def _loggable_value(value):
+    if isinstance(value, bytes):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, str) and len(value) > 200:
+        return value[:200] + "..."
+    return value
+
+
+slow_query_log = SlowQueryLog(
+    SLOW_QUERY_LOG_PATH or os.path.join(app.instance_path, "slow_queries.jsonl"),
+    SLOW_QUERY_LOG_MAX_BYTES, SLOW_QUERY_LOG_BACKUPS,
+)
+
+
+# ==================== 匿名响应缓存 ====================
+
+class MemoryResponseStore:
+    """进程内响应缓存，标签代数直接取 table_versions 中的表版本号
+
+    版本号和数据变更在同一事务里提交，其它 worker 进程、Celery 任务的写入
+    同样会让本进程的缓存条目失效，代价是每次查缓存多一次主键查询。
+    """
+
+    def __init__(self, maxsize):
+        self._cache = TTLCache(maxsize, ttl=60)
+
+    def generations(self, tags):
+        # 不带语句取连接固定走主库：副本上的版本号可能落后，会命中失效前的旧条目
+        versions = dict(db.session.connection().execute(
+            db.select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(tags))
+        ).all())
+        return [versions.get(tag, 0) for tag in tags]
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl):
+        self._cache.set(key, value, ttl)
+
+    def invalidate(self, tags):
+        pass  # 表版本号已随写入事务加一
+
+    def stats(self):
+        return dict(self._cache.stats(), backend="memory")
+
+
+class RedisResponseStore:
+    """redis 响应缓存，标签代数用 INCR 维护，所有 worker 共享"""
+    prefix = "nearus:resp:"
+
+    def __init__(self, url):
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self._client.ping()
+        self.hits = 0
+        self.misses = 0
 
+    def generations(self, tags):
+        values = self._client.mget([f"{self.prefix}tag:{tag}" for tag in tags])
+        return [int(value or 0) for value in values]
 
-def require_admin(user: User):
-    if user.user_type != "admin":
-        return jsonify({"error": "需要管理员权限"}), 403
-    return None
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        status, headers, body = json.loads(raw)
+        return status, headers, base64.b64decode(body)
 
+    def set(self, key, value, ttl):
+        status, headers, body = value
+        payload = json.dumps([status, headers, base64.b64encode(body).decode("ascii")])
+        self._client.set(self.prefix + key, payload, ex=max(1, int(ttl)))
 
-@app.route("/")
-def index():
-    return jsonify({
-        "message": "邻里APP后端API", 
-        "version": "1.0.0",
-        "endpoints": {
-            "health": "/health",
-            "auth": "/auth/login, /auth/register",
-            "users": "/users/me",
-            "posts": "/posts",
-            "groups": "/groups", 
-            "activities": "/activities",
-            "tasks": "/tasks",
-            "announcements": "/announcements",
-            "points": "/points/transfer",
-            "demo": "/demo/bootstrap"
+    def invalidate(self, tags):
+        pipe = self._client.pipeline()
+        for tag in tags:
+            pipe.incr(f"{self.prefix}tag:{tag}")
+        pipe.execute()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
         }
-    })
 
-@app.route("/health")
-def health():
-    return jsonify({"status": "ok", "time": datetime.utcnow().isoformat()})
 
+class _InflightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
 
-@app.route("/auth/register", methods=["POST"])
-def register():
-    data = request.get_json() or {}
-    username = (data.get("username") or "").strip()
-    password = (data.get("password") or "").strip()
-    phone = (data.get("phone") or "").strip()
-    email = (data.get("email") or "").strip() or None
-    real_name = (data.get("real_name") or "").strip() or None
-    if not username or not password or not phone:
-        return jsonify({"error": "username、password、phone 必填"}), 400
 
-    if User.query.filter((User.username == username) | (User.phone == phone)).first():
-        return jsonify({"error": "用户名或手机号已存在"}), 400
+class ResponseCache:
+    """按标签失效的响应缓存，附带单飞（single-flight）保护
 
-    pw_hash = bcrypt.generate_password_hash(password).decode("utf-8")
-    user = User(
-        username=username,
-        password_hash=pw_hash,
-        phone=phone,
-        email=email,
-        real_name=real_name,
-        interest_tags=json.dumps(data.get("interest_tags") or []),
-        is_verified=True,
-    )
-    db.session.add(user)
-    db.session.flush()
-    award_points(user, 50, "注册奖励积分")
-    db.session.commit()
+    缓存 key 由请求路径和各标签当前代数组成，写入提交后标签代数加一，旧条目
+    自然不再命中，由 TTL/LRU 回收。代数在计算响应之前读取，计算期间发生的
+    写入只会让这次结果存到一个没人再查的 key 下。同一 key 并发未命中时只有
+    第一个请求执行查询，其余请求等待并共享它的结果。
+    """
 
-    token = create_access_token(identity=str(user.id), expires_delta=timedelta(days=7))
-    return jsonify({"access_token": token, "user": user.to_dict()})
+    def __init__(self, store, wait_timeout):
+        self.store = store
+        self.wait_timeout = wait_timeout
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        self.errors = 0
 
+    def fetch(self, key, tags, ttl, compute):
+        try:
+            generations = self.store.generations(tags)
+            key = key + "|" + ",".join(f"{tag}:{gen}" for tag, gen in zip(tags, generations))
+            cached = self.store.get(key)
+        except Exception as e:
+            # 缓存后端故障时降级为直接计算
+            self.errors += 1
+            print(f"响应缓存不可用: {e}")
+            return compute()
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InflightCall()
+        if not leader:
+            with self._lock:
+                self.coalesced += 1
+            call.done.wait(self.wait_timeout)
+            return call.result if call.result is not None else compute()
 
-@app.route("/auth/login", methods=["POST"])
-def login():
-    data = request.get_json() or {}
-    username = (data.get("username") or "").strip()
-    password = (data.get("password") or "").strip()
-    user = User.query.filter_by(username=username).first()
-    if not user or not bcrypt.check_password_hash(user.password_hash, password):
-        return jsonify({"error": "用户名或密码错误"}), 401
-    token = create_access_token(identity=str(user.id), expires_delta=timedelta(days=7))
-    return jsonify({"access_token": token, "user": user.to_dict()})
+        try:
+            call.result = compute()
+            if call.result[0] == 200:
+                try:
+                    self.store.set(key, call.result, ttl)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"响应缓存写入失败: {e}")
+            return call.result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.done.set()
+
+    def invalidate(self, tags):
+        try:
+            self.store.invalidate(tags)
+        except Exception as e:
+            self.errors += 1
+            print(f"响应缓存失效失败: {e}")
 
+    def stats(self):
+        return dict(self.store.stats(), coalesced=self.coalesced, errors=self.errors)
 
-def current_user() -> User:
-    user_id = get_jwt_identity()
-    return User.query.get(int(user_id))
+
+def _create_response_cache():
+    if RESPONSE_CACHE_BACKEND == "off":
+        return None
+    if RESPONSE_CACHE_BACKEND == "redis":
+        try:
+            return ResponseCache(RedisResponseStore(os.getenv("REDIS_URL")), RESPONSE_CACHE_WAIT_TIMEOUT)
+        except Exception as e:
+            print(f"redis响应缓存不可用，改用进程内缓存: {e}")
+    return ResponseCache(MemoryResponseStore(RESPONSE_CACHE_SIZE), RESPONSE_CACHE_WAIT_TIMEOUT)
+
+
+response_cache = _create_response_cache()
+
+# 响应缓存只保留这些头，其余（如 Set-Cookie）每次重新生成
+CACHED_RESPONSE_HEADERS = ("Content-Type", "X-Next-Cursor")
+
+
+def cached_response(ttl, *tags):
+    """匿名 GET 的响应缓存，tags 为响应所依赖的表名，这些表有写入提交时失效
+
+    带 Authorization 头的请求不走缓存，保证登录用户看到的内容不被共享。
+    """
+    VERSIONED_TABLES.update(tags)
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if response_cache is None or request.method != "GET" or request.headers.get("Authorization"):
+                return fn(*args, **kwargs)
+
+            def compute():
+                # 缓存按本进程的写入提交失效，副本此时可能还没追上；填充缓存一律读主库，
+                # 避免把副本上的旧数据存进失效后的新缓存键
+                db.session.info.pop("read_replica", None)
+                response = app.make_response(fn(*args, **kwargs))
+                headers = [(k, v) for k, v in response.headers if k in CACHED_RESPONSE_HEADERS]
+                return response.status_code, headers, response.get_data()
+
+            status, headers, body = response_cache.fetch(request.full_path, tags, ttl, compute)
+            return Response(body, status=status, headers=headers)
+        return wrapper
+    return decorator
+
+
+@event.listens_for(db.session, "after_commit")
+def _invalidate_response_cache(session):
+    changed = session.info.pop("changed_tables", None)
+    if changed and response_cache is not None:
+        response_cache.invalidate(changed)
+
+
+@event.listens_for(db.session, "after_rollback")
+def _discard_changed_tables(session):
+    session.info.pop("changed_tables", None)
 
 
 @app.route("/users/me", methods=["GET", "PATCH"])
@@ -1297,11 +3728,18 @@ def me():
 
 
 @app.route("/posts", methods=["GET", "POST"])
+@read_replica
 @jwt_required(optional=True)
+@cached_response(10, "posts")
 def posts():
     if request.method == "GET":
-        items = Post.query.order_by(Post.created_at.desc()).limit(100).all()
-        return jsonify([p.to_dict() for p in items])
+        visible = Post.moderation_status != "pending_review"
+        if get_jwt_identity() is not None:
+            # 作者能看到自己待审核的动态；带登录态的请求不走响应缓存，不会串给其他人
+            visible = or_(visible, Post.user_id == int(get_jwt_identity()))
+        query = projection_query(Post).filter(visible)
+        rows, next_cursor = paginate_keyset(query, Post.created_at, Post.id)
+        return paginated_response(rows_to_dicts(Post, rows), next_cursor)
     if get_jwt_identity() is None:
         return jsonify({"error": "需要登录"}), 401
     user = current_user()
@@ -1309,24 +3747,75 @@ def posts():
     content = (data.get("content") or "").strip()
     if not content:
         return jsonify({"error": "内容不能为空"}), 400
+    group_id = data.get("group_id")
+    if group_id and not GroupMember.query.filter_by(group_id=group_id, user_id=user.id).first():
+        return jsonify({"error": "未加入该小组"}), 403
     post = Post(
         user_id=user.id,
         content=content,
         image_url=data.get("image_url"),
         post_type=data.get("post_type") or "normal",
+        group_id=group_id or None,
+        moderation_status="pending_review",
     )
     db.session.add(post)
     award_points(user, 5, "发布动态奖励")
     db.session.commit()
-    return jsonify(post.to_dict()), 201
+    moderation_queue.submit("post", post.id)
+    return jsonify(post.to_dict()), 202
+
+
+@app.route("/timeline", methods=["GET"])
+@jwt_required()
+def timeline():
+    """首页时间线：好友和所在小组的动态，按发布时间倒序游标分页"""
+    user = current_user()
+    posts, next_cursor = read_timeline(user.id, page_limit(), request.args.get("cursor"))
+    return paginated_response([p.to_dict() for p in posts], next_cursor)
+
+
+@app.route("/search", methods=["GET"])
+@jwt_required(optional=True)
+def search():
+    """全文搜索动态、问答和集市商品，按相关度排序游标分页
+
+    参数：q 关键词；type 逗号分隔的类型过滤（post/question/answer/marketplace），默认全部。
+    """
+    if not search_index_ready:
+        return jsonify({"error": "搜索暂不可用"}), 503
+    query_text = request.args.get("q", "").strip()
+    if not query_text:
+        return jsonify({"error": "q 必填"}), 400
+    kinds = [kind for kind in request.args.get("type", "").split(",") if kind] or list(SEARCHABLE_MODELS)
+    if any(kind not in SEARCHABLE_MODELS for kind in kinds):
+        return jsonify({"error": "type 无效"}), 400
+
+    hits, next_cursor = search_content(query_text, kinds, page_limit(), request.args.get("cursor"))
+    # 每种类型一次查询取回命中的记录
+    ids_by_kind = {}
+    for kind, item_id, _ in hits:
+        ids_by_kind.setdefault(kind, []).append(item_id)
+    items = {}
+    for kind, ids in ids_by_kind.items():
+        model = SEARCHABLE_MODELS[kind][0]
+        for row in projection_query(model).filter(model.id.in_(ids)):
+            items[(kind, row.id)] = model.to_dict(row)
+    results = [
+        {"type": kind, "id": item_id, "score": score, "item": items[(kind, item_id)]}
+        for kind, item_id, score in hits if (kind, item_id) in items
+    ]
+    return paginated_response(results, next_cursor)
 
 
 @app.route("/groups", methods=["GET", "POST"])
+@read_replica
 @jwt_required(optional=True)
+@conditional_get("groups")
+@cached_response(60, "groups")
 def groups():
     if request.method == "GET":
-        items = Group.query.order_by(Group.created_at.desc()).all()
-        return jsonify([g.to_dict() for g in items])
+        items, next_cursor = paginate_keyset(Group.query, Group.created_at, Group.id)
+        return paginated_response([g.to_dict() for g in items], next_cursor)
     if get_jwt_identity() is None:
         return jsonify({"error": "需要登录"}), 401
     data = request.get_json() or {}
@@ -1350,6 +3839,7 @@ def join_group(group_id: int):
     gm = GroupMember(group_id=group.id, user_id=user.id)
     db.session.add(gm)
     award_points(user, 3, f"加入小组: {group.name}")
+    backfill_timeline(user.id, group_id=group.id)
     db.session.commit()
     return jsonify({"message": "加入成功"})
 
@@ -1403,8 +3893,8 @@ def announcements():
 @jwt_required(optional=True)
 def activities():
     if request.method == "GET":
-        items = Activity.query.order_by(Activity.created_at.desc()).all()
-        return jsonify([a.to_dict() for a in items])
+        items, next_cursor = paginate_keyset(Activity.query, Activity.created_at, Activity.id)
+        return paginated_response([a.to_dict() for a in items], next_cursor)
     if get_jwt_identity() is None:
         return jsonify({"error": "需要登录"}), 401
     user = current_user()
@@ -1437,8 +3927,8 @@ def activities():
 @jwt_required(optional=True)
 def tasks():
     if request.method == "GET":
-        items = Task.query.order_by(Task.created_at.desc()).all()
-        return jsonify([t.to_dict() for t in items])
+        items, next_cursor = paginate_keyset(Task.query, Task.created_at, Task.id)
+        return paginated_response([t.to_dict() for t in items], next_cursor)
     if get_jwt_identity() is None:
         return jsonify({"error": "需要登录"}), 401
     user = current_user()
@@ -1505,21 +3995,75 @@ def transfer_points():
 
 
 # 聊天功能API
+@event.listens_for(db.session, "before_flush")
+def _assign_chat_publish_seq(session, flush_context, instances):
+    """消息第一次以非待审状态落库时，分配它在房间内的发布序号
+
+    序号用 UPDATE chat_rooms ... RETURNING 分配，这一行的写锁持有到事务提交，
+    同一房间里序号大的消息一定更晚提交。已读水位按序号推进，就不会漏掉 id 更小
+    但审核更晚通过的消息。
+    """
+    by_room = defaultdict(list)
+    for obj in list(session.new) + list(session.dirty):
+        if (isinstance(obj, ChatMessage) and obj.published_seq is None
+                and obj.moderation_status != "pending_review"):
+            by_room[obj.room_id].append(obj)
+    rooms = ChatRoom.__table__
+    for room_id, messages in sorted(by_room.items()):  # 固定加锁顺序
+        last = session.connection().execute(
+            rooms.update().where(rooms.c.id == room_id)
+            .values(published_seq=rooms.c.published_seq + len(messages))
+            .returning(rooms.c.published_seq)
+        ).scalar_one()
+        for seq, message in enumerate(sorted(messages, key=lambda m: m.id or 0), last - len(messages) + 1):
+            message.published_seq = seq
+
+
+def list_chat_rooms(user_id):
+    """用户加入的活跃聊天室，附带角色、最后一条消息和未读数
+
+    固定两次查询：房间、角色、最后一条消息 id 和未读数用相关子查询一次取回；
+    再按 id 批量取最后一条消息。最后一条消息和消息列表一样按 (created_at, id)
+    取本人可见的最新一条，沿 (room_id, created_at) 索引倒序查找。未读数是已读
+    水位之后发布的、别人发的消息数，沿 (room_id, published_seq) 索引计数，
+    待审消息没有序号，自然不计入。
+    """
+    last_message_id = db.session.query(ChatMessage.id).filter(
+        ChatMessage.room_id == ChatRoom.id,
+        or_(ChatMessage.moderation_status != "pending_review", ChatMessage.sender_id == user_id),
+    ).order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(1).correlate(ChatRoom).scalar_subquery()
+    unread_count = db.session.query(db.func.count(ChatMessage.id)).filter(
+        ChatMessage.room_id == ChatRoom.id,
+        ChatMessage.published_seq > db.func.coalesce(ChatMember.last_read_seq, 0),
+        ChatMessage.sender_id != user_id,
+    ).correlate(ChatRoom, ChatMember).scalar_subquery()
+    rows = db.session.query(ChatRoom, ChatMember.role, last_message_id, unread_count).join(
+        ChatMember, ChatMember.room_id == ChatRoom.id
+    ).filter(ChatMember.user_id == user_id, ChatRoom.is_active == True).order_by(ChatMember.id).all()
+
+    message_ids = [message_id for _, _, message_id, _ in rows if message_id is not None]
+    last_messages = {}
+    if message_ids:
+        for message in projection_query(ChatMessage).filter(ChatMessage.id.in_(message_ids)):
+            last_messages[message.id] = ChatMessage.to_dict(message)
+
+    rooms = []
+    for room, role, message_id, unread in rows:
+        room_data = room.to_dict()
+        room_data["user_role"] = role
+        room_data["last_message"] = last_messages.get(message_id)
+        room_data["unread_count"] = unread
+        rooms.append(room_data)
+    return rooms
+
+
 @app.route("/chat/rooms", methods=["GET", "POST"])
 @jwt_required()
 def chat_rooms():
     user = current_user()
     if request.method == "GET":
         # 获取用户加入的聊天室
-        memberships = ChatMember.query.filter_by(user_id=user.id).all()
-        rooms = []
-        for membership in memberships:
-            room = ChatRoom.query.get(membership.room_id)
-            if room and room.is_active:
-                room_data = room.to_dict()
-                room_data["user_role"] = membership.role
-                rooms.append(room_data)
-        return jsonify(rooms)
+        return jsonify(list_chat_rooms(user.id))
     
     # 创建聊天室
     data = request.get_json() or {}
@@ -1562,10 +4106,12 @@ def join_chat_room(room_id: int):
     if existing_member:
         return jsonify({"message": "已经是聊天室成员"})
     
+    # 加入前的历史消息不算未读
     member = ChatMember(
         room_id=room_id,
         user_id=user.id,
-        role="member"
+        role="member",
+        last_read_seq=room.published_seq,
     )
     db.session.add(member)
     
@@ -1594,7 +4140,10 @@ def chat_messages(room_id: int):
     
     if request.method == "GET":
         # 获取聊天记录
-        messages = ChatMessage.query.filter_by(room_id=room_id).order_by(ChatMessage.created_at.desc()).limit(50).all()
+        messages = ChatMessage.query.filter(
+            ChatMessage.room_id == room_id,
+            or_(ChatMessage.moderation_status != "pending_review", ChatMessage.sender_id == user.id),
+        ).order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(50).all()
         return jsonify([msg.to_dict() for msg in reversed(messages)])
     
     # 发送消息
@@ -1603,16 +4152,46 @@ def chat_messages(room_id: int):
     if not content:
         return jsonify({"error": "消息内容不能为空"}), 400
     
+    message = write_pipeline.run(_save_chat_message, room_id, user.id, content, data.get("message_type") or "text")
+    moderation_queue.submit("chat_message", message["id"])
+    
+    return jsonify(message), 202
+
+
+@app.route("/chat/rooms/<int:room_id>/read", methods=["POST"])
+@jwt_required()
+def mark_chat_room_read(room_id: int):
+    """推进已读水位到 seq（客户端已展示的最大发布序号），不传则标记全部已读；水位只进不退"""
+    user = current_user()
+    room_seq = db.session.query(ChatRoom.published_seq).filter(ChatRoom.id == room_id).scalar()
+    if room_seq is None:
+        return jsonify({"error": "聊天室不存在"}), 404
+    member = ChatMember.query.filter_by(room_id=room_id, user_id=user.id).first()
+    if not member:
+        return jsonify({"error": "不是聊天室成员"}), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        seq = room_seq if data.get("seq") is None else min(int(data["seq"]), room_seq)
+    except (TypeError, ValueError):
+        return jsonify({"error": "seq 必须是整数"}), 400
+    if seq > (member.last_read_seq or 0):
+        member.last_read_seq = seq
+        db.session.commit()
+    return jsonify({"room_id": room_id, "last_read_seq": member.last_read_seq or 0})
+
+
+def _save_chat_message(room_id, sender_id, content, message_type="text"):
+    """聊天消息先以 pending_review 入库，返回消息字典"""
     message = ChatMessage(
         room_id=room_id,
-        sender_id=user.id,
+        sender_id=sender_id,
         content=content,
-        message_type=data.get("message_type") or "text"
+        message_type=message_type,
+        moderation_status="pending_review"
     )
     db.session.add(message)
-    db.session.commit()
-    
-    return jsonify(message.to_dict()), 201
+    db.session.flush()
+    return message.to_dict()
 
 
 # 好友功能API
@@ -1621,27 +4200,25 @@ def chat_messages(room_id: int):
 def get_friends():
     user = current_user()
     
-    # 获取已接受的好友关系
-    friendships = Friendship.query.filter(
+    # 获取已接受的好友关系，对方用户信息一并 JOIN 出来
+    friend_id = db.case((Friendship.user_id == user.id, Friendship.friend_id), else_=Friendship.user_id)
+    rows = db.session.query(
+        Friendship.id, User.id, User.username, User.real_name, User.user_type
+    ).join(User, User.id == friend_id).filter(
         ((Friendship.user_id == user.id) | (Friendship.friend_id == user.id)) &
         (Friendship.status == "accepted")
     ).all()
     
-    friends = []
-    for friendship in friendships:
-        if friendship.user_id == user.id:
-            friend_user = User.query.get(friendship.friend_id)
-        else:
-            friend_user = User.query.get(friendship.user_id)
-        
-        if friend_user:
-            friends.append({
-                "id": friend_user.id,
-                "username": friend_user.username,
-                "real_name": friend_user.real_name,
-                "user_type": friend_user.user_type,
-                "friendship_id": friendship.id
-            })
+    friends = [
+        {
+            "id": uid,
+            "username": username,
+            "real_name": real_name,
+            "user_type": user_type,
+            "friendship_id": friendship_id
+        }
+        for friendship_id, uid, username, real_name, user_type in rows
+    ]
     
     return jsonify(friends)
 
@@ -1652,20 +4229,23 @@ def get_friend_requests():
     user = current_user()
     
     # 获取待处理的好友请求
-    requests = Friendship.query.filter_by(friend_id=user.id, status="pending").all()
-    
-    request_list = []
-    for req in requests:
-        requester = User.query.get(req.user_id)
-        if requester:
-            request_list.append({
-                "id": req.id,
-                "user_id": requester.id,
-                "username": requester.username,
-                "real_name": requester.real_name,
-                "user_type": requester.user_type,
-                "created_at": req.created_at.isoformat()
-            })
+    rows = db.session.query(
+        Friendship.id, Friendship.created_at, User.id, User.username, User.real_name, User.user_type
+    ).join(User, User.id == Friendship.user_id).filter(
+        Friendship.friend_id == user.id, Friendship.status == "pending"
+    ).all()
+    
+    request_list = [
+        {
+            "id": request_id,
+            "user_id": requester_id,
+            "username": username,
+            "real_name": real_name,
+            "user_type": user_type,
+            "created_at": created_at.isoformat()
+        }
+        for request_id, created_at, requester_id, username, real_name, user_type in rows
+    ]
     
     return jsonify(request_list)
 
@@ -1714,6 +4294,8 @@ def accept_friend_request(request_id: int):
     
     friendship.status = "accepted"
     friendship.accepted_at = datetime.utcnow()
+    backfill_timeline(user.id, author_id=friendship.user_id)
+    backfill_timeline(friendship.user_id, author_id=user.id)
     db.session.commit()
     
     return jsonify({"message": "好友请求已接受"})
@@ -1743,30 +4325,25 @@ def search_users():
     if not query:
         return jsonify([])
     
-    # 搜索用户（排除自己）
-    users = User.query.filter(
-        User.username.contains(query),
-        User.id != user.id
-    ).limit(10).all()
+    # 搜索用户（排除自己），好友关系一次批量查出
+    ids = search_user_ids(query, user.id, 10)
+    users = {
+        row.id: row for row in
+        db.session.query(User.id, User.username, User.real_name, User.user_type).filter(User.id.in_(ids))
+    }
+    statuses = friendship_statuses(user.id, ids)
     
     user_list = []
-    for u in users:
-        # 检查好友关系
-        friendship = Friendship.query.filter(
-            ((Friendship.user_id == user.id) & (Friendship.friend_id == u.id)) |
-            ((Friendship.user_id == u.id) & (Friendship.friend_id == user.id))
-        ).first()
-        
-        status = "none"
-        if friendship:
-            status = friendship.status
-        
+    for user_id in ids:
+        u = users.get(user_id)
+        if u is None:
+            continue
         user_list.append({
             "id": u.id,
             "username": u.username,
             "real_name": u.real_name,
             "user_type": u.user_type,
-            "friendship_status": status
+            "friendship_status": statuses.get(u.id, "none")
         })
     
     return jsonify(user_list)
@@ -2055,11 +4632,15 @@ def bootstrap():
 
 # 2. 本地商家地图API
 @app.route("/businesses", methods=["GET", "POST"])
+@read_replica
 @jwt_required(optional=True)
+@conditional_get("businesses")
+@cached_response(60, "businesses")
 def businesses():
     if request.method == "GET":
-        businesses = Business.query.filter_by(is_verified=True).all()
-        return jsonify([b.to_dict() for b in businesses])
+        query = Business.query.filter_by(is_verified=True)
+        businesses, next_cursor = paginate_keyset(query, Business.created_at, Business.id)
+        return paginated_response([b.to_dict() for b in businesses], next_cursor)
     
     user = current_user()
     if user.user_type not in ["admin", "merchant"]:
@@ -2176,7 +4757,10 @@ def claim_coupon(code):
 
 # 4. 投票系统API
 @app.route("/polls", methods=["GET", "POST"])
+@read_replica
 @jwt_required(optional=True)
+@conditional_get("polls")
+@cached_response(30, "polls")
 def polls():
     if request.method == "GET":
         polls = Poll.query.filter_by(is_active=True, is_public=True).order_by(Poll.created_at.desc()).all()
@@ -2223,23 +4807,29 @@ def vote_poll(poll_id):
     if not selected_options:
         return jsonify({"error": "请选择投票选项"}), 400
     
-    vote = PollVote(
-        poll_id=poll_id,
-        user_id=user.id,
-        selected_options=json.dumps(selected_options)
-    )
-    db.session.add(vote)
-    db.session.commit()
+    try:
+        write_pipeline.run(_record_poll_vote, poll_id, user.id, selected_options)
+    except IntegrityError:
+        return jsonify({"error": "您已经参与过此投票"}), 400
     
     return jsonify({"message": "投票成功"})
 
+
+def _record_poll_vote(poll_id, user_id, selected_options):
+    db.session.add(PollVote(
+        poll_id=poll_id,
+        user_id=user_id,
+        selected_options=json.dumps(selected_options)
+    ))
+
 # 5. 图片分享墙API
 @app.route("/photos", methods=["GET", "POST"])
 @jwt_required(optional=True)
 def photos():
     if request.method == "GET":
-        photos = Photo.query.filter_by(is_public=True).order_by(Photo.created_at.desc()).all()
-        return jsonify([p.to_dict() for p in photos])
+        query = Photo.query.filter_by(is_public=True)
+        photos, next_cursor = paginate_keyset(query, Photo.created_at, Photo.id)
+        return paginated_response([p.to_dict() for p in photos], next_cursor)
     
     user = current_user()
     data = request.get_json() or {}
@@ -2262,11 +4852,16 @@ def photos():
 
 # 6. 事件日历API
 @app.route("/events", methods=["GET", "POST"])
+@read_replica
 @jwt_required(optional=True)
+@conditional_get("events")
+@cached_response(60, "events")
 def events():
     if request.method == "GET":
-        events = Event.query.filter_by(is_public=True).order_by(Event.start_time).all()
-        return jsonify([e.to_dict() for e in events])
+        # 日历按开始时间正序翻页
+        query = projection_query(Event).filter(Event.is_public == True)
+        rows, next_cursor = paginate_keyset(query, Event.start_time, Event.id, descending=False)
+        return paginated_response(rows_to_dicts(Event, rows), next_cursor)
     
     user = current_user()
     data = request.get_json() or {}
@@ -2322,8 +4917,9 @@ def join_event(event_id):
 @jwt_required(optional=True)
 def marketplace():
     if request.method == "GET":
-        items = MarketplaceItem.query.filter_by(is_sold=False).order_by(MarketplaceItem.created_at.desc()).all()
-        return jsonify([i.to_dict() for i in items])
+        query = projection_query(MarketplaceItem).filter(MarketplaceItem.is_sold == False)
+        rows, next_cursor = paginate_keyset(query, MarketplaceItem.created_at, MarketplaceItem.id)
+        return paginated_response(rows_to_dicts(MarketplaceItem, rows), next_cursor)
     
     user = current_user()
     data = request.get_json() or {}
@@ -2353,8 +4949,8 @@ def marketplace():
 @jwt_required(optional=True)
 def skills():
     if request.method == "GET":
-        skills = Skill.query.all()
-        return jsonify([s.to_dict() for s in skills])
+        skills, next_cursor = paginate_keyset(Skill.query, Skill.created_at, Skill.id)
+        return paginated_response([s.to_dict() for s in skills], next_cursor)
     
     user = current_user()
     data = request.get_json() or {}
@@ -2414,10 +5010,11 @@ def get_stats():
     total_tasks = Task.query.count()
     
     # 今日活跃用户
-    today = datetime.utcnow().date()
-    today_activities = UserActivity.query.filter(
-        db.func.date(UserActivity.created_at) == today
-    ).distinct(UserActivity.user_id).count()
+    # 按时间范围过滤才能走 created_at 索引；date(created_at) == today 会逐行计算
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    today_activities = db.session.query(db.func.count(db.distinct(UserActivity.user_id))).filter(
+        UserActivity.created_at >= today_start
+    ).scalar()
     
     stats = {
         "total_users": total_users,
@@ -2431,6 +5028,9 @@ def get_stats():
 
 # 10. 社区小游戏API
 @app.route("/games", methods=["GET"])
+@read_replica
+@conditional_get("games")
+@cached_response(300, "games")
 def get_games():
     games = Game.query.filter_by(is_active=True).all()
     return jsonify([g.to_dict() for g in games])
@@ -2540,8 +5140,8 @@ def enter_lottery(lottery_id):
 @jwt_required(optional=True)
 def questions():
     if request.method == "GET":
-        questions = Question.query.order_by(Question.created_at.desc()).all()
-        return jsonify([q.to_dict() for q in questions])
+        questions, next_cursor = paginate_keyset(Question.query, Question.created_at, Question.id)
+        return paginated_response([q.to_dict() for q in questions], next_cursor)
     
     user = current_user()
     data = request.get_json() or {}
@@ -2566,7 +5166,10 @@ def answers(question_id):
     question = Question.query.get_or_404(question_id)
     
     if request.method == "GET":
-        answers = Answer.query.filter_by(question_id=question_id).order_by(Answer.created_at).all()
+        visible = Answer.moderation_status != "pending_review"
+        if get_jwt_identity() is not None:
+            visible = or_(visible, Answer.user_id == int(get_jwt_identity()))
+        answers = Answer.query.filter(Answer.question_id == question_id, visible).order_by(Answer.created_at).all()
         return jsonify([a.to_dict() for a in answers])
     
     user = current_user()
@@ -2578,12 +5181,14 @@ def answers(question_id):
     answer = Answer(
         question_id=question_id,
         content=content,
-        user_id=user.id
+        user_id=user.id,
+        moderation_status="pending_review"
     )
     question.answers_count += 1
     db.session.add(answer)
     db.session.commit()
-    return jsonify(answer.to_dict()), 201
+    moderation_queue.submit("answer", answer.id)
+    return jsonify(answer.to_dict()), 202
 
 # 14. 社区活动签到系统API
 @app.route("/events/<int:event_id>/checkin", methods=["POST"])
@@ -2598,25 +5203,33 @@ def event_checkin(event_id):
         return jsonify({"error": "您已经签到过此活动"}), 400
     
     data = request.get_json() or {}
+    write_pipeline.run(
+        _record_event_checkin, event_id, user.id, data.get("latitude"), data.get("longitude"),
+        f"活动签到奖励: {event.title}"
+    )
+    
+    return jsonify({"message": "签到成功", "points_earned": 10})
+
+
+def _record_event_checkin(event_id, user_id, latitude, longitude, description):
     checkin = EventCheckIn(
         event_id=event_id,
-        user_id=user.id,
-        location_latitude=data.get("latitude"),
-        location_longitude=data.get("longitude"),
+        user_id=user_id,
+        location_latitude=latitude,
+        location_longitude=longitude,
         points_earned=10  # 签到奖励10积分
     )
     
     # 奖励积分
-    award_points(user, 10, f"活动签到奖励: {event.title}")
+    award_points(db.session.get(User, user_id), 10, description)
     
     db.session.add(checkin)
-    db.session.commit()
-    
-    return jsonify({"message": "签到成功", "points_earned": 10})
 
 # ==================== 游戏化功能API端点 ====================
 
 @app.route("/api/leaderboard", methods=["GET"])
+@read_replica
+@cached_response(60, "users", "point_transactions")
 def get_leaderboard():
     period = request.args.get('period', 'all')
     
@@ -2797,7 +5410,7 @@ def complete_quest(quest_id):
 def get_notifications():
     user = current_user()
     
-    notifications = Notification.query.filter_by(user_id=user.id).order_by(
+    notifications = projection_query(Notification).filter(Notification.user_id == user.id).order_by(
         Notification.created_at.desc()
     ).limit(50).all()
     
@@ -2806,7 +5419,7 @@ def get_notifications():
     ).count()
     
     return jsonify({
-        "notifications": [notif.to_dict() for notif in notifications],
+        "notifications": rows_to_dicts(Notification, notifications),
         "unread_count": unread_count
     })
 
@@ -2854,41 +5467,59 @@ def delete_notification(notification_id):
     return jsonify({"message": "Notification deleted"})
 
 
+def attach_image_interactions(images, user, comment_limit=10):
+    """给一页图片补上当前用户是否点赞和前几条评论
+
+    点赞状态和评论各用一次查询取回，评论按图片分区编号后取每张图片的前
+    comment_limit 条，评论者用户名随评论 JOIN 出来。
+    """
+    ids = [image["id"] for image in images]
+    if not ids:
+        return images
+    liked_ids = set()
+    if user:
+        liked_ids = {image_id for (image_id,) in db.session.query(ImageLike.image_id).filter(
+            ImageLike.user_id == user.id, ImageLike.image_id.in_(ids)
+        )}
+    position = db.func.row_number().over(
+        partition_by=ImageComment.image_id, order_by=ImageComment.id
+    ).label("position")
+    ranked = projection_query(ImageComment, User.username, position).outerjoin(
+        User, User.id == ImageComment.user_id
+    ).filter(ImageComment.image_id.in_(ids)).subquery()
+    rows = db.session.query(ranked).filter(ranked.c.position <= comment_limit).order_by(
+        ranked.c.image_id, ranked.c.position
+    )
+    comments = {}
+    for row in rows:
+        comments.setdefault(row.image_id, []).append(ImageComment.to_dict(row))
+    for image in images:
+        if user:
+            image["liked"] = image["id"] in liked_ids
+        image["comments"] = comments.get(image["id"], [])
+    return images
+
+
 @app.route("/api/images", methods=["GET"])
 @jwt_required(optional=True)
 def get_images():
     filter_type = request.args.get('filter', 'all')
     user = current_user() if request.headers.get('Authorization') else None
     
-    query = Image.query.filter_by(is_public=True)
+    # 作者用户名随图片一起 JOIN 出来，不再逐行懒加载 image.user
+    query = projection_query(Image, User.username).outerjoin(User, User.id == Image.user_id)
     
     if filter_type == 'recent':
-        query = query.order_by(Image.created_at.desc())
+        query = query.filter(Image.is_public == True).order_by(Image.created_at.desc())
     elif filter_type == 'popular':
-        query = query.order_by(Image.likes.desc())
+        query = query.filter(Image.is_public == True).order_by(Image.likes.desc())
     elif filter_type == 'mine' and user:
-        query = Image.query.filter_by(user_id=user.id)
+        query = query.filter(Image.user_id == user.id)
+    else:
+        query = query.filter(Image.is_public == True)
     
     images = query.limit(50).all()
-    
-    result = []
-    for image in images:
-        image_dict = image.to_dict()
-        
-        # Check if current user liked this image
-        if user:
-            liked = ImageLike.query.filter_by(
-                image_id=image.id, user_id=user.id
-            ).first() is not None
-            image_dict["liked"] = liked
-        
-        # Load comments
-        comments = ImageComment.query.filter_by(image_id=image.id).limit(10).all()
-        image_dict["comments"] = [comment.to_dict() for comment in comments]
-        
-        result.append(image_dict)
-    
-    return jsonify(result)
+    return jsonify(attach_image_interactions(rows_to_dicts(Image, images), user))
 
 
 @app.route("/api/images/upload", methods=["POST"])
@@ -2940,39 +5571,43 @@ def like_image(image_id):
     if existing_like:
         return jsonify({"error": "Already liked"}), 400
     
-    # Create like
-    like = ImageLike(image_id=image_id, user_id=user.id)
-    db.session.add(like)
-    
-    # Update image like count
-    image.likes += 1
-    
-    db.session.commit()
+    try:
+        write_pipeline.run(_record_image_like, image.id, user.id)
+    except IntegrityError:
+        return jsonify({"error": "Already liked"}), 400
     
     return jsonify({"message": "Image liked"})
 
 
+def _record_image_like(image_id, user_id):
+    db.session.add(ImageLike(image_id=image_id, user_id=user_id))
+    Image.query.filter_by(id=image_id).update({Image.likes: Image.likes + 1})
+
+
 @app.route("/api/images/<int:image_id>/like", methods=["DELETE"])
 @jwt_required()
 def unlike_image(image_id):
     user = current_user()
     
-    like = ImageLike.query.filter_by(
+    ImageLike.query.filter_by(
         image_id=image_id, user_id=user.id
     ).first_or_404()
     
-    db.session.delete(like)
-    
-    # Update image like count
-    image = Image.query.get(image_id)
-    if image:
-        image.likes = max(0, image.likes - 1)
-    
-    db.session.commit()
+    # 并发的重复取消只有一个真正删到点赞记录
+    if not write_pipeline.run(_record_image_unlike, image_id, user.id):
+        return jsonify({"error": "Not liked"}), 404
     
     return jsonify({"message": "Image unliked"})
 
 
+def _record_image_unlike(image_id, user_id):
+    """删除点赞记录并把计数减一，返回是否删到了记录"""
+    deleted = ImageLike.query.filter_by(image_id=image_id, user_id=user_id).delete()
+    if deleted:
+        Image.query.filter_by(id=image_id).update({Image.likes: Image.likes - 1})
+    return bool(deleted)
+
+
 @app.route("/api/images/<int:image_id>/comments", methods=["POST"])
 @jwt_required()
 def add_image_comment(image_id):
@@ -3044,22 +5679,20 @@ def handle_send_message(data):
     user_id = data.get('user_id')
     
     if room and message and user_id:
-        # 保存消息到数据库
-        chat_message = ChatMessage(
-            room_id=int(room),
-            sender_id=int(user_id),
-            content=message
-        )
-        db.session.add(chat_message)
-        db.session.commit()
+        # 保存消息到数据库，审核通过后由审核队列广播给房间内所有用户
+        try:
+            chat_message = write_pipeline.run(_save_chat_message, int(room), int(user_id), message)
+        except WritePipelineBusy:
+            emit('error', {'error': '服务繁忙，请稍后重试'})
+            return
+        moderation_queue.submit("chat_message", chat_message["id"])
         
-        # 广播消息给房间内所有用户
-        emit('new_message', {
-            'id': chat_message.id,
-            'content': message,
-            'sender_id': user_id,
-            'created_at': chat_message.created_at.isoformat()
-        }, room=room)
+        # 只回执给发送者
+        emit('message_accepted', {
+            'id': chat_message["id"],
+            'moderation_status': chat_message["moderation_status"],
+            'created_at': chat_message["created_at"]
+        })
 
 @socketio.on('send_notification')
 def handle_send_notification(data):
@@ -3095,16 +5728,271 @@ def check_content():
     result = check_sensitive_content(content)
     return jsonify(result)
 
+@app.route("/api/content/check/batch", methods=["POST"])
+@jwt_required()
+def check_content_batch():
+    """批量检查内容（管理员/版主），以 NDJSON 流式返回每条结果
+
+    请求体: {"contents": ["文本", {"id": 1, "content": "文本"}, ...]}
+    每行输出: {"index": 0, "id": 1, "is_safe": ..., ...}
+    """
+    user = current_user()
+    if user.user_type not in [ROLES['ADMIN'], ROLES['MODERATOR']]:
+        return jsonify({"error": "权限不足"}), 403
+
+    data = request.get_json() or {}
+    items = data.get('contents')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "contents 必须是非空列表"}), 400
+    if len(items) > MODERATION_BATCH_MAX:
+        return jsonify({"error": f"单次最多检查 {MODERATION_BATCH_MAX} 条"}), 400
+
+    ids = []
+    contents = []
+    for item in items:
+        if isinstance(item, dict):
+            ids.append(item.get('id'))
+            contents.append(item.get('content') or '')
+        else:
+            ids.append(None)
+            contents.append(item or '')
+
+    def generate():
+        for index, result in enumerate(check_sensitive_content_many(contents)):
+            line = {"index": index, **result}
+            if ids[index] is not None:
+                line["id"] = ids[index]
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+@app.route("/api/admin/cache/stats", methods=["GET"])
+@jwt_required()
+def get_cache_stats():
+    """查看各类缓存的命中统计（仅管理员）"""
+    user = current_user()
+    if (err := require_admin(user)) is not None:
+        return err
+    return jsonify({
+        "moderation": dict(moderation_cache.stats(), dictionary_version=sensitive_words_version),
+        "user_identity": dict(user_identity_cache.stats(), **user_lookup_stats),
+        "response": response_cache.stats() if response_cache is not None else None,
+    })
+
+@app.route("/api/admin/slow-queries", methods=["GET"])
+@jwt_required()
+def get_slow_queries():
+    """按语句形态汇总慢查询日志，按累计耗时倒序返回前 limit 种（仅管理员）"""
+    user = current_user()
+    if (err := require_admin(user)) is not None:
+        return err
+    groups = {}
+    for entry in slow_query_log.read():
+        group = groups.get(entry["shape"])
+        if group is None:
+            group = groups[entry["shape"]] = {
+                "shape": entry["shape"], "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "routes": Counter(), "last_seen": None, "slowest": None,
+            }
+        group["count"] += 1
+        group["total_ms"] += entry["duration_ms"]
+        group["routes"][entry["route"]] += 1
+        group["last_seen"] = entry["time"]
+        if entry["duration_ms"] >= group["max_ms"]:
+            group["max_ms"] = entry["duration_ms"]
+            group["slowest"] = {key: entry[key] for key in ("time", "duration_ms", "parameters", "route", "plan")}
+    top = sorted(groups.values(), key=lambda group: group["total_ms"], reverse=True)[:page_limit()]
+    for group in top:
+        group["avg_ms"] = round(group["total_ms"] / group["count"], 2)
+        group["total_ms"] = round(group["total_ms"], 2)
+        group["routes"] = dict(group["routes"].most_common())
+    return jsonify({"threshold_ms": SLOW_QUERY_THRESHOLD_MS, "shapes": len(groups), "top": top})
+
+@app.route("/api/admin/search/rebuild", methods=["POST"])
+@jwt_required()
+def rebuild_search():
+    """按现有数据重建全文索引（仅管理员）"""
+    user = current_user()
+    if (err := require_admin(user)) is not None:
+        return err
+    if not search_index_ready:
+        return jsonify({"error": "搜索暂不可用"}), 503
+    return jsonify({"message": "索引已重建", "indexed": rebuild_search_index()})
+
+# 数据导出API
+EXPORTABLE_MODELS = {
+    "users": User,
+    "posts": Post,
+    "activities": Activity,
+    "tasks": Task,
+    "events": Event,
+    "marketplace": MarketplaceItem,
+    "point_transactions": PointTransaction,
+}
+
+
+@app.route("/api/admin/export/<string:kind>", methods=["GET"])
+@jwt_required()
+def export_table(kind):
+    """全量导出一张表（仅管理员），按 id 顺序流式返回 JSON 数组"""
+    user = current_user()
+    if (err := require_admin(user)) is not None:
+        return err
+    model = EXPORTABLE_MODELS.get(kind)
+    if model is None:
+        return jsonify({"error": "不支持导出该数据"}), 404
+    query = model.query.order_by(model.id).yield_per(JSON_STREAM_CHUNK_SIZE)
+    return stream_json_array(item.to_dict() for item in query)
+
+# 用户批量导入API
+def _read_import_rows():
+    """从 CSV（上传文件或 text/csv 请求体）或 JSON 中读取待导入的行"""
+    upload = request.files.get("file")
+    if upload is not None or request.mimetype == "text/csv":
+        text = upload.read().decode("utf-8-sig") if upload is not None else request.get_data(as_text=True)
+        return list(csv.DictReader(io.StringIO(text)))
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("users")
+    return data if isinstance(data, list) else None
+
+
+def _normalize_import_row(raw):
+    row = {}
+    for field in ("username", "password", "phone", "email", "real_name"):
+        value = raw.get(field)
+        row[field] = str(value).strip() if value is not None else ""
+    tags = raw.get("interest_tags") or []
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.replace("；", ";").split(";") if tag.strip()]
+    row["interest_tags"] = tags
+    return row
+
+
+def _import_user_chunk(rows, seen_usernames, seen_phones, seen_emails):
+    """导入一批用户，返回 (成功数, [(行号, 用户名, 错误), ...])"""
+    errors = []
+    valid = []
+    for index, row in rows:
+        if not row["username"] or not row["password"] or not row["phone"]:
+            errors.append((index, row["username"], "username、password、phone 必填"))
+        elif (row["username"] in seen_usernames or row["phone"] in seen_phones
+              or (row["email"] and row["email"] in seen_emails)):
+            errors.append((index, row["username"], "文件内用户名、手机号或邮箱重复"))
+        else:
+            seen_usernames.add(row["username"])
+            seen_phones.add(row["phone"])
+            if row["email"]:
+                seen_emails.add(row["email"])
+            valid.append((index, row))
+    if not valid:
+        return 0, errors
+
+    # 一次查询找出这一批里已被占用的用户名、手机号和邮箱
+    usernames = [row["username"] for _, row in valid]
+    phones = [row["phone"] for _, row in valid]
+    emails = [row["email"] for _, row in valid if row["email"]]
+    taken_usernames = set()
+    taken_phones = set()
+    taken_emails = set()
+    for username, phone, email in db.session.query(User.username, User.phone, User.email).filter(
+        or_(User.username.in_(usernames), User.phone.in_(phones), User.email.in_(emails))
+    ):
+        taken_usernames.add(username)
+        taken_phones.add(phone)
+        taken_emails.add(email)
+    fresh = []
+    for index, row in valid:
+        if (row["username"] in taken_usernames or row["phone"] in taken_phones
+                or (row["email"] and row["email"] in taken_emails)):
+            errors.append((index, row["username"], "用户名、手机号或邮箱已存在"))
+        else:
+            fresh.append((index, row))
+    if not fresh:
+        return 0, errors
+
+    hashes = password_hasher.hash_many([row["password"] for _, row in fresh])
+    user_rows = [
+        {
+            "username": row["username"],
+            "password_hash": pw_hash,
+            "phone": row["phone"],
+            "email": row["email"] or None,
+            "real_name": row["real_name"] or None,
+            "interest_tags": json.dumps(row["interest_tags"]),
+            "credit_points": 50,
+            "is_verified": True,
+        }
+        for (_, row), pw_hash in zip(fresh, hashes)
+    ]
+    try:
+        user_ids = db.session.scalars(
+            insert(User).returning(User.id, sort_by_parameter_order=True), user_rows
+        ).all()
+        db.session.execute(insert(PointTransaction), [
+            {"to_user_id": user_id, "amount": 50, "description": "注册奖励积分"}
+            for user_id in user_ids
+        ])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        errors.extend((index, row["username"], "写入冲突，用户名、手机号或邮箱已存在") for index, row in fresh)
+        return 0, errors
+    return len(user_ids), errors
+
+
+@app.route("/api/admin/users/import", methods=["POST"])
+@jwt_required()
+def import_users():
+    """批量导入用户（仅管理员），以 NDJSON 流式返回逐行错误和进度
+
+    支持 CSV（表头 username,password,phone,email,real_name,interest_tags，
+    兴趣标签用分号分隔）或 JSON {"users": [{...}, ...]}。
+    """
+    user = current_user()
+    if (err := require_admin(user)) is not None:
+        return err
+
+    raw_rows = _read_import_rows()
+    if not raw_rows:
+        return jsonify({"error": "没有可导入的数据"}), 400
+    rows = [(index, _normalize_import_row(raw if isinstance(raw, dict) else {}))
+            for index, raw in enumerate(raw_rows, 1)]
+
+    def generate():
+        seen_usernames = set()
+        seen_phones = set()
+        seen_emails = set()
+        created = failed = 0
+        for start in range(0, len(rows), USER_IMPORT_CHUNK_SIZE):
+            chunk = rows[start:start + USER_IMPORT_CHUNK_SIZE]
+            try:
+                count, errors = _import_user_chunk(chunk, seen_usernames, seen_phones, seen_emails)
+            except PasswordHasherBusy:
+                count, errors = 0, [(index, row["username"], "服务繁忙，请稍后重试") for index, row in chunk]
+            created += count
+            failed += len(errors)
+            for index, username, message in errors:
+                yield json.dumps({"type": "error", "row": index, "username": username, "error": message},
+                                 ensure_ascii=False) + "\n"
+            yield json.dumps({"type": "progress", "processed": start + len(chunk), "total": len(rows),
+                              "created": created, "failed": failed}) + "\n"
+        yield json.dumps({"type": "done", "total": len(rows), "created": created, "failed": failed}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
 # 敏感词管理API
 @app.route("/api/admin/sensitive-words", methods=["GET"])
 @jwt_required()
 def get_sensitive_words():
     """获取敏感词列表（仅管理员）"""
     user = current_user()
-    if not has_role(user, ROLES.ADMIN):
+    if not has_role(user, ROLES['ADMIN']):
         return jsonify({"error": "权限不足"}), 403
     
+    sync_sensitive_words(force=True)
     return jsonify({
+        "version": sensitive_words_version,
         "sensitive_words": chinese_sensitive_words,
         "total_count": len(chinese_sensitive_words)
     })
@@ -3114,7 +6002,7 @@ def get_sensitive_words():
 def add_sensitive_word():
     """添加敏感词（仅管理员）"""
     user = current_user()
-    if not has_role(user, ROLES.ADMIN):
+    if not has_role(user, ROLES['ADMIN']):
         return jsonify({"error": "权限不足"}), 403
     
     data = request.get_json()
@@ -3123,35 +6011,250 @@ def add_sensitive_word():
     if not word:
         return jsonify({"error": "敏感词不能为空"}), 400
     
-    if word in chinese_sensitive_words:
+    seed_sensitive_words()
+    if SensitiveWord.query.filter_by(word=word).first():
         return jsonify({"error": "敏感词已存在"}), 400
     
-    chinese_sensitive_words.append(word)
+    db.session.add(SensitiveWord(word=word, created_by=user.id))
+    try:
+        version = _bump_sensitive_words_version()
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "敏感词已存在"}), 400
     
-    # valx会自动使用更新后的chinese_sensitive_words列表
+    sync_sensitive_words(force=True)
+    dictionary_bus.publish(version)
     
-    return jsonify({"message": "敏感词添加成功", "word": word})
+    return jsonify({"message": "敏感词添加成功", "word": word, "version": version})
 
 @app.route("/api/admin/sensitive-words/<word>", methods=["DELETE"])
 @jwt_required()
 def delete_sensitive_word(word):
     """删除敏感词（仅管理员）"""
     user = current_user()
-    if not has_role(user, ROLES.ADMIN):
+    if not has_role(user, ROLES['ADMIN']):
         return jsonify({"error": "权限不足"}), 403
     
-    if word not in chinese_sensitive_words:
+    seed_sensitive_words()
+    record = SensitiveWord.query.filter_by(word=word).first()
+    if not record:
         return jsonify({"error": "敏感词不存在"}), 404
     
-    chinese_sensitive_words.remove(word)
-    
-    # valx会自动使用更新后的chinese_sensitive_words列表
+    db.session.delete(record)
+    version = _bump_sensitive_words_version()
+    db.session.commit()
     
-    return jsonify({"message": "敏感词删除成功", "word": word})
+    sync_sensitive_words(force=True)
+    dictionary_bus.publish(version)
+    
+    return jsonify({"message": "敏感词删除成功", "word": word, "version": version})
+
+# ==================== 数据库迁移 ====================
+#
+# create_all() 只会创建缺失的表，已有表新增的列和索引靠这里的迁移补上。新库
+# 由 create_all() 建好全部结构，迁移都写成可重复执行的，跑一遍只是登记版本。
+# 新增迁移时追加一个更大的版本号，已发布的迁移不要再修改。
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return decorator
+
+
+def _add_column(conn, table, column, ddl):
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _create_unique_index(conn, table, name, columns):
+    """建唯一索引；已有重复行时每组保留 id 最小的一条，其余移到备份表 <表名>_duplicates 并打印条数"""
+    duplicates = f"SELECT id FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {columns})"
+    removed = conn.execute(text(f"SELECT count(*) FROM ({duplicates})")).scalar()
+    if removed:
+        backup = f"{table}_duplicates"
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {backup} AS SELECT * FROM {table} WHERE 0"))
+        conn.execute(text(f"INSERT INTO {backup} SELECT * FROM {table} WHERE id IN ({duplicates})"))
+        conn.execute(text(f"DELETE FROM {table} WHERE id IN ({duplicates})"))
+        print(f"{table} 按 ({columns}) 去重，移除 {removed} 行，原数据已备份到 {backup} 表，请核对")
+    conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+@migration(1, "posts/answers/chat_messages 增加 moderation_status")
+def _migrate_moderation_status(conn):
+    for table in ("posts", "answers", "chat_messages"):
+        _add_column(conn, table, "moderation_status", "VARCHAR(32) NOT NULL DEFAULT 'published'")
+
+
+@migration(2, "posts 增加 group_id、fanned_out")
+def _migrate_post_timeline_columns(conn):
+    _add_column(conn, "posts", "group_id", "INTEGER REFERENCES groups (id)")
+    _add_column(conn, "posts", "fanned_out", "BOOLEAN NOT NULL DEFAULT 1")
+
+
+@migration(3, "热点查询的组合索引与唯一索引")
+def _migrate_hot_indexes(conn):
+    # DDL 写死为本迁移发布时的索引，模型上后来增删的索引由各自的迁移负责
+    for ddl in (
+        "CREATE INDEX IF NOT EXISTS ix_users_credit_points ON users (credit_points)",
+        "CREATE INDEX IF NOT EXISTS ix_users_phone_suffix ON users (substr(phone, -4))",
+        "CREATE INDEX IF NOT EXISTS ix_users_real_name ON users (real_name)",
+        "CREATE INDEX IF NOT EXISTS ix_posts_created ON posts (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_posts_group_created ON posts (group_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_posts_user_created ON posts (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_groups_created ON groups (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_group_members_user ON group_members (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_activities_created ON activities (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_created ON tasks (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_point_transactions_from_user_created ON point_transactions (from_user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_point_transactions_to_user_created ON point_transactions (to_user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_chat_members_user ON chat_members (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_chat_messages_room_created ON chat_messages (room_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_friendships_friend_status ON friendships (friend_id, status)",
+        "CREATE INDEX IF NOT EXISTS ix_friendships_user_friend_status ON friendships (user_id, friend_id, status)",
+        "CREATE INDEX IF NOT EXISTS ix_notifications_user_read_created ON notifications (user_id, is_read, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_businesses_created ON businesses (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_user_coupons_user ON user_coupons (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_photos_created ON photos (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_events_start ON events (start_time, id)",
+        "CREATE INDEX IF NOT EXISTS ix_marketplace_items_created ON marketplace_items (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_skills_created ON skills (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_questions_created ON questions (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS ix_user_activities_created ON user_activities (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_user_quests_user_quest ON user_quests (user_id, quest_id)",
+        "CREATE INDEX IF NOT EXISTS ix_images_public_created ON images (is_public, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_images_public_likes ON images (is_public, likes)",
+        "CREATE INDEX IF NOT EXISTS ix_images_user ON images (user_id)",
+        "CREATE INDEX IF NOT EXISTS ix_user_achievements_user ON user_achievements (user_id, achievement_id)",
+    ):
+        conn.execute(text(ddl))
+    for table, name, columns in (
+        ("group_members", "uq_group_members_group_user", "group_id, user_id"),
+        ("chat_members", "uq_chat_members_room_user", "room_id, user_id"),
+        ("user_coupons", "uq_user_coupons_coupon_user", "coupon_id, user_id"),
+        ("poll_votes", "uq_poll_votes_poll_user", "poll_id, user_id"),
+        ("event_participants", "uq_event_participants_event_user", "event_id, user_id"),
+        ("image_likes", "uq_image_likes_image_user", "image_id, user_id"),
+        ("lottery_entries", "uq_lottery_entries_lottery_user", "lottery_id, user_id"),
+    ):
+        _create_unique_index(conn, table, name, columns)
+
+
+@migration(4, "chat_members 增加已读水位 last_read_message_id")
+def _migrate_chat_read_watermark(conn):
+    _add_column(conn, "chat_members", "last_read_message_id", "INTEGER")
+    # 原先没有按成员记录的已读状态，把已有成员的水位放到各房间当前最后一条消息
+    conn.execute(text(
+        "UPDATE chat_members SET last_read_message_id = "
+        "(SELECT max(id) FROM chat_messages WHERE chat_messages.room_id = chat_members.room_id)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chat_messages_room_id ON chat_messages (room_id, id)"))
+
+
+@migration(5, "回填历史动态的时间线")
+def _migrate_backfill_timeline(conn):
+    # 迁移 2 把已有动态默认标成 fanned_out=1，但它们从没写过时间线，升级后首页是空的。
+    # 写扩散至少会写作者自己那一行，一行都没有的已发布动态就是没扩散过的，按批补写
+    last_id = 0
+    while True:
+        posts = conn.execute(text(
+            "SELECT id, user_id, group_id, created_at FROM posts WHERE id > :last_id AND fanned_out = 1 "
+            "AND moderation_status != 'pending_review' "
+            "AND NOT EXISTS (SELECT 1 FROM timeline_entries WHERE timeline_entries.post_id = posts.id) "
+            "ORDER BY id LIMIT :batch"
+        ).columns(created_at=db.DateTime), {"last_id": last_id, "batch": 1000}).all()
+        if not posts:
+            break
+        rows, pulled_ids = _timeline_rows(posts, timeline_audiences(posts, conn))
+        conn.execute(insert(TimelineEntry.__table__).prefix_with("OR IGNORE", dialect="sqlite"), rows)
+        if pulled_ids:
+            conn.execute(
+                text("UPDATE posts SET fanned_out = 0 WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+                {"ids": pulled_ids},
+            )
+        last_id = posts[-1].id
+
+
+@migration(6, "answers/event_checkins 按问题、活动查询的组合索引")
+def _migrate_answer_checkin_indexes(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_answers_question_created ON answers (question_id, created_at)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_event_checkins_event_user ON event_checkins (event_id, user_id)"))
+
+
+@migration(7, "users 增加 lower(username)、lower(real_name) 表达式索引")
+def _migrate_user_lower_indexes(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_username_lower ON users (lower(username))"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_users_real_name_lower ON users (lower(real_name))"))
+
+
+@migration(8, "聊天消息发布序号，已读水位改按发布序号计算")
+def _migrate_chat_publish_seq(conn):
+    # 审核有先后，id 小的消息可能更晚发布，按 id 推进的水位会把它永远算成已读
+    _add_column(conn, "chat_rooms", "published_seq", "INTEGER NOT NULL DEFAULT 0")
+    _add_column(conn, "chat_messages", "published_seq", "INTEGER")
+    _add_column(conn, "chat_members", "last_read_seq", "INTEGER")
+    # 已发布的历史消息按 id 顺序编号
+    conn.execute(text(
+        "UPDATE chat_messages SET published_seq = ranked.seq FROM ("
+        "SELECT id, row_number() OVER (PARTITION BY room_id ORDER BY id) AS seq FROM chat_messages "
+        "WHERE moderation_status != 'pending_review') AS ranked "
+        "WHERE chat_messages.id = ranked.id AND chat_messages.published_seq IS NULL"
+    ))
+    conn.execute(text(
+        "UPDATE chat_rooms SET published_seq = "
+        "coalesce((SELECT max(published_seq) FROM chat_messages WHERE chat_messages.room_id = chat_rooms.id), 0)"
+    ))
+    # 原水位换算成它所覆盖的最后一条已发布消息的序号
+    conn.execute(text(
+        "UPDATE chat_members SET last_read_seq = (SELECT max(published_seq) FROM chat_messages "
+        "WHERE chat_messages.room_id = chat_members.room_id AND chat_messages.id <= chat_members.last_read_message_id) "
+        "WHERE last_read_message_id IS NOT NULL"
+    ))
+    conn.execute(text("ALTER TABLE chat_members DROP COLUMN last_read_message_id"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_chat_messages_room_id"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chat_messages_room_seq ON chat_messages (room_id, published_seq)"))
+
+
+@migration(9, "image_comments 按图片查询的索引")
+def _migrate_image_comment_index(conn):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_image_comments_image_id ON image_comments (image_id)"))
+
+
+@migration(10, "删除不再使用的 lower(real_name) 索引")
+def _migrate_drop_real_name_lower_index(conn):
+    # 短输入改为子串匹配，不再按真实姓名前缀查找
+    conn.execute(text("DROP INDEX IF EXISTS ix_users_real_name_lower"))
+
+
+def run_migrations():
+    """按版本号顺序执行尚未执行的迁移，每个迁移和它的登记在同一个事务里"""
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    applied = {version for (version,) in db.session.query(SchemaMigration.version)}
+    db.session.commit()
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        with db.engine.begin() as conn:
+            fn(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+        print(f"已执行数据库迁移 {version}: {description}")
+
 
 def _ensure_db_initialized():
     with app.app_context():
         db.create_all()
+        run_migrations()
+        seed_table_versions()
+        ensure_search_index()
+        ensure_user_search_index()
+        seed_sensitive_words()
+        requeue_pending_moderation()
         print("Database initialized")
 
 
@@ -3163,27 +6266,11 @@ def get_image_wall():
     """获取图片墙数据"""
     user = current_user() if request.headers.get('Authorization') else None
     
-    # 获取公开的图片
-    images = Image.query.filter_by(is_public=True).order_by(Image.created_at.desc()).limit(50).all()
-    
-    result = []
-    for image in images:
-        image_dict = image.to_dict()
-        
-        # 检查当前用户是否点赞
-        if user:
-            liked = ImageLike.query.filter_by(
-                image_id=image.id, user_id=user.id
-            ).first() is not None
-            image_dict["liked"] = liked
-        
-        # 加载评论
-        comments = ImageComment.query.filter_by(image_id=image.id).limit(10).all()
-        image_dict["comments"] = [comment.to_dict() for comment in comments]
-        
-        result.append(image_dict)
-    
-    return jsonify(result)
+    # 获取公开的图片，作者用户名一并 JOIN 出来
+    images = projection_query(Image, User.username).outerjoin(User, User.id == Image.user_id).filter(
+        Image.is_public == True
+    ).order_by(Image.created_at.desc()).limit(50).all()
+    return jsonify(attach_image_interactions(rows_to_dicts(Image, images), user))
 
 
 @app.route("/image-wall/upload", methods=["POST"])
@@ -3236,14 +6323,10 @@ def like_image_wall(image_id):
     if existing_like:
         return jsonify({"error": "Already liked"}), 400
     
-    # 创建点赞
-    like = ImageLike(image_id=image_id, user_id=user.id)
-    db.session.add(like)
-    
-    # 更新图片点赞数
-    image.likes += 1
-    
-    db.session.commit()
+    try:
+        write_pipeline.run(_record_image_like, image.id, user.id)
+    except IntegrityError:
+        return jsonify({"error": "Already liked"}), 400
     
     return jsonify({"message": "Image liked"})
 
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+写入管道成组提交基准测试
+
+若干线程并发发送聊天消息（与 POST /chat/rooms/<id>/messages、Socket.IO
+send_message 走同一个写函数），分别在逐条提交和写入管道成组提交两种方式
+下运行，并分别使用 SQLite 默认配置（回滚日志，synchronous=FULL）和
+production 配置（WAL，synchronous=NORMAL）。报告每秒写入数、p95 延迟、
+平均每组提交的写入数和错误数。每种组合在独立子进程里用新的临时库运行。
+
+用法（在项目根目录执行）：
+    python -m benchmarks.bench_group_commit
+    python -m benchmarks.bench_group_commit --threads 32 --seconds 10
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+MODES = {
+    "逐条提交": {"WRITE_PIPELINE_ENABLED": "0"},
+    "成组提交": {"WRITE_PIPELINE_ENABLED": "1"},
+}
+PROFILES = ("default", "production")
+
+
+def worker(threads, seconds):
+    """在子进程里跑一轮写入负载，输出一行 JSON 结果"""
+    import app as nearus
+
+    with nearus.app.app_context():
+        nearus.db.create_all()
+        user = nearus.User(username="bench", phone="13900000000", password_hash="x")
+        nearus.db.session.add(user)
+        nearus.db.session.flush()
+        room = nearus.ChatRoom(name="bench", created_by=user.id)
+        nearus.db.session.add(room)
+        nearus.db.session.commit()
+        user_id, room_id = user.id, room.id
+
+    stop = threading.Event()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def write_loop():
+        samples = []
+        failed = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            with nearus.app.app_context():
+                try:
+                    nearus.write_pipeline.run(nearus._save_chat_message, room_id, user_id, "你好")
+                    samples.append(time.perf_counter() - start)
+                except Exception:
+                    failed += 1
+        with lock:
+            latencies.extend(samples)
+            errors[0] += failed
+
+    pool = [threading.Thread(target=write_loop) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in pool:
+        t.join()
+
+    ordered = sorted(latencies)
+    print(json.dumps({
+        "writes_per_s": len(ordered) / seconds,
+        "p95_ms": ordered[int(len(ordered) * 0.95) - 1] * 1000 if ordered else 0.0,
+        "avg_group_size": nearus.write_pipeline.stats()["avg_group_size"] or 1,
+        "errors": errors[0],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.threads, args.seconds)
+        return
+
+    print(f"写线程 {args.threads}，每种组合运行 {args.seconds}s")
+    print(f"{'存储配置':<12} {'方式':<8} {'写/秒':>8} {'p95(ms)':>9} {'每组写入':>8} {'错误':>6}")
+    for profile in PROFILES:
+        for name, overrides in MODES.items():
+            db_dir = tempfile.mkdtemp(prefix="nearus-bench-")
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{os.path.join(db_dir, 'bench.db')}",
+                SQLITE_PROFILE=profile,
+                RESPONSE_CACHE_BACKEND="off",
+                **overrides,
+            )
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_group_commit", "--worker",
+                 "--threads", str(args.threads), "--seconds", str(args.seconds)],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            r = json.loads(out.strip().splitlines()[-1])
+            print(f"{profile:<12} {name:<8} {r['writes_per_s']:>8.0f} {r['p95_ms']:>9.1f} "
+                  f"{r['avg_group_size']:>8.1f} {r['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+登录吞吐量基准测试
+
+在临时 SQLite 库里创建测试用户，用 N 个并发线程同时请求 /auth/login，
+对比 bcrypt 在请求线程内计算（inline）与交给进程池计算（pool）时的
+吞吐量和延迟；同时测量并发登录期间 /health 的响应延迟，反映登录高峰
+对其它请求的影响。
+
+用法（在项目根目录执行）：
+    python -m benchmarks.bench_login
+    python -m benchmarks.bench_login --concurrency 50 200 1000 --rounds 10
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_db_dir = tempfile.mkdtemp(prefix="nearus-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+import app as nearus  # noqa: E402
+
+USERS = 50
+PASSWORD = "bench-password"
+
+
+def setup(rounds):
+    hasher = nearus.PasswordHasher(rounds, 0, 1, 0)
+    with nearus.app.app_context():
+        nearus.db.create_all()
+        pw_hash = hasher.hash(PASSWORD)
+        for i in range(USERS):
+            nearus.db.session.add(nearus.User(username=f"bench{i}", phone=f"139{i:08d}", password_hash=pw_hash))
+        nearus.db.session.commit()
+
+
+def login(i):
+    client = nearus.app.test_client()
+    start = time.perf_counter()
+    resp = client.post("/auth/login", json={"username": f"bench{i % USERS}", "password": PASSWORD})
+    return resp.status_code, time.perf_counter() - start
+
+
+def probe_health(stop, samples):
+    client = nearus.app.test_client()
+    while not stop.is_set():
+        start = time.perf_counter()
+        client.get("/health")
+        samples.append(time.perf_counter() - start)
+        time.sleep(0.01)
+
+
+def run(concurrency):
+    stop = threading.Event()
+    health = []
+    prober = threading.Thread(target=probe_health, args=(stop, health))
+    prober.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(login, range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    prober.join()
+
+    latencies = sorted(latency for _, latency in results)
+    ok = sum(1 for status, _ in results if status == 200)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    health_p95 = sorted(health)[int(len(health) * 0.95) - 1] if health else 0.0
+    return ok, ok / elapsed, statistics.median(latencies), p95, health_p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--rounds", type=int, default=nearus.BCRYPT_LOG_ROUNDS, help="bcrypt 代价")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="进程池大小")
+    args = parser.parse_args()
+
+    setup(args.rounds)
+    modes = [
+        ("inline", nearus.PasswordHasher(args.rounds, 0, 1, 0)),
+        ("pool", nearus.PasswordHasher(args.rounds, args.workers, max(args.concurrency), 600)),
+    ]
+    print(f"bcrypt rounds={args.rounds}, pool workers={args.workers}")
+    print(f"{'mode':>8} {'conc':>6} {'ok':>6} {'logins/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'health p95 ms':>14}")
+    for name, hasher in modes:
+        nearus.password_hasher = hasher
+        for concurrency in args.concurrency:
+            ok, rate, p50, p95, health_p95 = run(concurrency)
+            print(f"{name:>8} {concurrency:>6} {ok:>6} {rate:>10.1f} {p50 * 1000:>9.1f} "
+                  f"{p95 * 1000:>9.1f} {health_p95 * 1000:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+列表读取路径基准测试：ORM 实例 vs 列投影 Row
+
+在临时 SQLite 库里生成 N 条动态和集市商品，分别用两种方式读取并序列化：
+  orm         Model.query...all() 后逐个调用 to_dict()（原有写法）
+  projection  projection_query(Model) 只查 to_dict 所需列，Row 交给 to_dict
+报告每行 CPU 耗时（微秒）和每行峰值内存（tracemalloc，字节）。
+
+用法（在项目根目录执行）：
+    python -m benchmarks.bench_projection
+    python -m benchmarks.bench_projection --rows 20000 --repeat 5
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+_db_dir = tempfile.mkdtemp(prefix="nearus-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+
+import app as nearus  # noqa: E402
+
+db = nearus.db
+
+
+def setup(rows):
+    with nearus.app.app_context():
+        db.create_all()
+        owner = nearus.User(username="bench", phone="13900000000", password_hash="x")
+        db.session.add(owner)
+        db.session.flush()
+        now = datetime.utcnow()
+        db.session.execute(nearus.insert(nearus.Post), [
+            {"user_id": owner.id, "content": f"今天小区门口的早餐店开张了，第 {i} 条动态", "created_at": now - timedelta(seconds=i)}
+            for i in range(rows)
+        ])
+        db.session.execute(nearus.insert(nearus.MarketplaceItem), [
+            {"title": f"九成新自行车 {i}", "description": "通勤用，搬家出", "price": 200.0, "images": '["/uploads/a.jpg"]',
+             "seller_id": owner.id, "location": "3号楼", "created_at": now - timedelta(seconds=i)}
+            for i in range(rows)
+        ])
+        db.session.commit()
+
+
+def read_orm(model):
+    return [item.to_dict() for item in model.query.order_by(model.created_at.desc()).all()]
+
+
+def read_projection(model):
+    rows = nearus.projection_query(model).order_by(model.created_at.desc()).all()
+    return nearus.rows_to_dicts(model, rows)
+
+
+def measure(fn, model, rows, repeat):
+    # 计时与内存分开测，tracemalloc 本身的开销不计入 CPU 时间
+    timings = []
+    for _ in range(repeat):
+        with nearus.app.app_context():
+            start = time.process_time()
+            result = fn(model)
+            timings.append(time.process_time() - start)
+            assert len(result) == rows
+            db.session.remove()
+    with nearus.app.app_context():
+        tracemalloc.start()
+        fn(model)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        db.session.remove()
+    return min(timings) / rows * 1e6, peak / rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    setup(args.rows)
+    print(f"{'模型':<16} {'方式':<11} {'CPU(us/行)':>11} {'内存(B/行)':>11}")
+    for model in (nearus.Post, nearus.MarketplaceItem):
+        results = {}
+        for name, fn in (("orm", read_orm), ("projection", read_projection)):
+            results[name] = measure(fn, model, args.rows, args.repeat)
+            cpu, mem = results[name]
+            print(f"{model.__name__:<16} {name:<11} {cpu:>11.2f} {mem:>11.0f}")
+        (orm_cpu, orm_mem), (proj_cpu, proj_mem) = results["orm"], results["projection"]
+        print(f"{'':<16} {'节省':<11} {1 - proj_cpu / orm_cpu:>10.0%} {1 - proj_mem / orm_mem:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+敏感词过滤吞吐量基准测试
+
+对比三种实现在 1k / 50k 词表下的吞吐量：
+  - legacy:    原先逐词 `in` + `str.replace` 的循环
+  - valx:      valx.detect_profanity / remove_profanity（未安装时跳过）
+  - automaton: SensitiveWordMatcher 单遍扫描（normalize=False）
+  - normalized: 同上，开启全角/繁体归一化与标点跳过；要求耗时不超过 automaton 的 1.5 倍
+
+用法（在项目根目录执行）：
+    python -m benchmarks.bench_sensitive_filter
+    python -m benchmarks.bench_sensitive_filter --texts 500 --sizes 1000 50000
+"""
+
+import argparse
+import random
+import time
+
+from app import SensitiveWordMatcher
+
+try:
+    import valx
+except Exception:
+    valx = None
+
+# 常用汉字区间，用来合成词表和文本
+CJK_START, CJK_END = 0x4E00, 0x4E00 + 3000
+
+
+def make_words(count, rng):
+    words = set()
+    while len(words) < count:
+        length = rng.randint(2, 4)
+        words.add(''.join(chr(rng.randint(CJK_START, CJK_END)) for _ in range(length)))
+    return list(words)
+
+
+def make_texts(count, words, rng, length=200):
+    texts = []
+    for _ in range(count):
+        # 夹杂少量空格和标点，模拟真实文本
+        chars = [
+            rng.choice(' ，。！') if rng.random() < 0.05 else chr(rng.randint(CJK_START, CJK_END))
+            for _ in range(length)
+        ]
+        # 每条文本插入少量真实敏感词，模拟实际命中率
+        for _ in range(rng.randint(0, 3)):
+            pos = rng.randint(0, length - 1)
+            chars[pos] = rng.choice(words)
+        texts.append(''.join(chars))
+    return texts
+
+
+def legacy_check(content, words):
+    found_words = []
+    filtered_content = content
+    for word in words:
+        if word in content:
+            found_words.append(word)
+            filtered_content = filtered_content.replace(word, '*' * len(word))
+    return found_words, filtered_content
+
+
+def valx_check(content, words):
+    result = valx.detect_profanity([content], custom_words_list=words)
+    if result:
+        valx.remove_profanity([content], custom_words_list=words)
+    return result
+
+
+def measure(fn, texts):
+    start = time.perf_counter()
+    for text in texts:
+        fn(text)
+    elapsed = time.perf_counter() - start
+    return len(texts) / elapsed if elapsed else float('inf')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 50000], help='词表大小')
+    parser.add_argument('--texts', type=int, default=300, help='每轮检查的文本条数')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'words':>8} {'engine':>10} {'texts/s':>12} {'speedup':>9}")
+    ratios = []
+    for size in args.sizes:
+        words = make_words(size, rng)
+        texts = make_texts(args.texts, words, rng)
+
+        build_start = time.perf_counter()
+        matcher = SensitiveWordMatcher(words, normalize=False)
+        build_ms = (time.perf_counter() - build_start) * 1000
+        normalized = SensitiveWordMatcher(words, normalize=True)
+
+        baseline = measure(lambda t: legacy_check(t, words), texts)
+        rows = [('legacy', baseline)]
+        if valx is not None:
+            # valx 每条都走 pandas 流程，只取少量样本避免跑太久
+            rows.append(('valx', measure(lambda t: valx_check(t, words), texts[:20])))
+        plain_rate = measure(matcher.check, texts)
+        normalized_rate = measure(normalized.check, texts)
+        rows.append(('automaton', plain_rate))
+        rows.append(('normalized', normalized_rate))
+        ratios.append((size, plain_rate / normalized_rate))
+
+        for name, rate in rows:
+            print(f"{size:>8} {name:>10} {rate:>12.1f} {rate / baseline:>8.1f}x")
+        print(f"{size:>8} {'(build)':>10} {build_ms:>10.1f}ms")
+
+    print()
+    for size, ratio in ratios:
+        verdict = 'OK' if ratio <= 1.5 else 'OVER BUDGET'
+        print(f"normalization cost at {size} words: {ratio:.2f}x plain scan ({verdict})")
+
+
+if __name__ == '__main__':
+    main()
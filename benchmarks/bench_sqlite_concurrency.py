@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+SQLite 并发读写基准测试
+
+模拟聊天高峰：若干写线程不断插入聊天消息并提交（同 Socket.IO send_message），
+同时若干读线程请求 /posts 和聊天记录。分别在两种存储配置下运行：
+  default     SQLite 默认的回滚日志模式 + SQLAlchemy 默认连接池（5+10）
+  production  WAL + synchronous=NORMAL + mmap/cache + 调大的连接池
+报告读写吞吐量、p95 延迟和 "database is locked" 等错误数。每种配置在独立
+子进程里用新的临时库运行。
+
+用法（在项目根目录执行）：
+    python -m benchmarks.bench_sqlite_concurrency
+    python -m benchmarks.bench_sqlite_concurrency --writers 8 --readers 16 --seconds 10
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROFILES = {
+    "default": {"SQLITE_PROFILE": "default", "DB_POOL_SIZE": "5", "DB_MAX_OVERFLOW": "10"},
+    "production": {"SQLITE_PROFILE": "production"},
+}
+
+
+def worker(writers, readers, seconds):
+    """在子进程里跑一轮负载，输出一行 JSON 结果"""
+    import app as nearus
+    from flask_jwt_extended import create_access_token
+    from sqlalchemy.exc import OperationalError
+
+    with nearus.app.app_context():
+        nearus.db.create_all()
+        user = nearus.User(username="bench", phone="13900000000", password_hash="x")
+        nearus.db.session.add(user)
+        nearus.db.session.flush()
+        room = nearus.ChatRoom(name="bench", created_by=user.id)
+        nearus.db.session.add(room)
+        nearus.db.session.flush()
+        nearus.db.session.add(nearus.ChatMember(room_id=room.id, user_id=user.id, role="owner"))
+        for i in range(200):
+            nearus.db.session.add(nearus.Post(user_id=user.id, content=f"动态 {i}"))
+            nearus.db.session.add(nearus.ChatMessage(room_id=room.id, sender_id=user.id, content=f"消息 {i}"))
+        nearus.db.session.commit()
+        user_id, room_id = user.id, room.id
+        headers = {"Authorization": "Bearer " + create_access_token(identity=str(user_id))}
+
+    stop = threading.Event()
+    results = {"write": [], "read": [], "errors": 0}
+    lock = threading.Lock()
+
+    def write_loop():
+        latencies = []
+        errors = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            with nearus.app.app_context():
+                try:
+                    nearus.db.session.add(nearus.ChatMessage(room_id=room_id, sender_id=user_id, content="你好"))
+                    nearus.db.session.commit()
+                    latencies.append(time.perf_counter() - start)
+                except OperationalError:
+                    nearus.db.session.rollback()
+                    errors += 1
+        with lock:
+            results["write"].extend(latencies)
+            results["errors"] += errors
+
+    def read_loop():
+        client = nearus.app.test_client()
+        latencies = []
+        errors = 0
+        paths = ["/posts", f"/chat/rooms/{room_id}/messages"]
+        i = 0
+        while not stop.is_set():
+            start = time.perf_counter()
+            resp = client.get(paths[i % 2], headers=headers)
+            i += 1
+            if resp.status_code == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+        with lock:
+            results["read"].extend(latencies)
+            results["errors"] += errors
+
+    threads = [threading.Thread(target=write_loop) for _ in range(writers)]
+    threads += [threading.Thread(target=read_loop) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    def p95(samples):
+        return sorted(samples)[int(len(samples) * 0.95) - 1] * 1000 if samples else 0.0
+
+    print(json.dumps({
+        "writes_per_s": len(results["write"]) / seconds,
+        "reads_per_s": len(results["read"]) / seconds,
+        "write_p95_ms": p95(results["write"]),
+        "read_p95_ms": p95(results["read"]),
+        "errors": results["errors"],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.writers, args.readers, args.seconds)
+        return
+
+    print(f"写线程 {args.writers}，读线程 {args.readers}，每种配置运行 {args.seconds}s")
+    print(f"{'配置':<12} {'写/秒':>8} {'读/秒':>8} {'写p95(ms)':>10} {'读p95(ms)':>10} {'错误':>6}")
+    for name, overrides in PROFILES.items():
+        db_dir = tempfile.mkdtemp(prefix="nearus-bench-")
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(db_dir, 'bench.db')}",
+            RESPONSE_CACHE_BACKEND="off",
+            USER_CACHE_TTL="0",
+            **overrides,
+        )
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_sqlite_concurrency", "--worker",
+             "--writers", str(args.writers), "--readers", str(args.readers), "--seconds", str(args.seconds)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{name:<12} {r['writes_per_s']:>8.0f} {r['reads_per_s']:>8.0f} "
+              f"{r['write_p95_ms']:>10.1f} {r['read_p95_ms']:>10.1f} {r['errors']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+大列表 JSON 序列化基准测试
+
+在临时 SQLite 库里生成 N 条活动记录，分别用两种方式序列化整张表：
+  jsonify  先构造全部 to_dict() 列表，再一次性编码（原有写法）
+  stream   query.yield_per() + stream_json_array() 按块编码、分块发送
+每种方式在独立子进程里运行，比较峰值 RSS 增量、首字节时间（TTFB）和总耗时。
+
+用法（在项目根目录执行）：
+    python -m benchmarks.bench_streaming_json
+    python -m benchmarks.bench_streaming_json --rows 10000 50000 200000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+MODES = ("jsonify", "stream")
+
+
+def _max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def seed(db_path, rows):
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    import app as nearus
+
+    with nearus.app.app_context():
+        nearus.db.create_all()
+        owner = nearus.User(username="bench", phone="13900000000", password_hash="x")
+        nearus.db.session.add(owner)
+        nearus.db.session.flush()
+        now = datetime.utcnow()
+        batch = []
+        for i in range(rows):
+            batch.append({
+                "title": f"活动 {i}",
+                "description": "周末一起在小区花园里做手工、聊聊天，欢迎邻居们带孩子参加。" * 2,
+                "location": "小区中心花园",
+                "start_time": now + timedelta(hours=i),
+                "created_by": owner.id,
+                "created_at": now,
+            })
+            if len(batch) == 5000:
+                nearus.db.session.execute(nearus.insert(nearus.Activity), batch)
+                batch = []
+        if batch:
+            nearus.db.session.execute(nearus.insert(nearus.Activity), batch)
+        nearus.db.session.commit()
+
+
+def worker(db_path, mode):
+    """在子进程里跑一次序列化，输出一行 JSON 结果"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    import app as nearus
+
+    Activity = nearus.Activity
+    with nearus.app.test_request_context("/bench"):
+        Activity.query.limit(1).all()  # 预热连接和映射配置，不计入增量
+        baseline = _max_rss_kb()
+        start = time.perf_counter()
+        if mode == "jsonify":
+            rows = [a.to_dict() for a in Activity.query.order_by(Activity.id).all()]
+            response = nearus.jsonify(rows)
+        else:
+            query = Activity.query.order_by(Activity.id).yield_per(nearus.JSON_STREAM_CHUNK_SIZE)
+            response = nearus.stream_json_array(a.to_dict() for a in query)
+        ttfb = None
+        size = 0
+        for chunk in response.response:
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+            size += len(chunk)
+        total = time.perf_counter() - start
+    print(json.dumps({
+        "mode": mode,
+        "rss_delta_mb": (_max_rss_kb() - baseline) / 1024,
+        "ttfb_ms": ttfb * 1000,
+        "total_ms": total * 1000,
+        "bytes": size,
+    }))
+
+
+def run(db_path, mode):
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_streaming_json", "--worker", mode, "--db", db_path],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--worker", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.db, args.worker)
+        return
+
+    encoder = "orjson" if _has_orjson() else "json"
+    print(f"编码器: {encoder}")
+    print(f"{'行数':>8} {'方式':>8} {'RSS增量(MB)':>12} {'TTFB(ms)':>10} {'总耗时(ms)':>11} {'大小(MB)':>9}")
+    for rows in args.rows:
+        db_dir = tempfile.mkdtemp(prefix="nearus-bench-")
+        db_path = os.path.join(db_dir, "bench.db")
+        subprocess.run([sys.executable, "-c", f"from benchmarks.bench_streaming_json import seed; seed({db_path!r}, {rows})"],
+                       check=True, capture_output=True)
+        for mode in MODES:
+            r = run(db_path, mode)
+            print(f"{rows:>8} {mode:>8} {r['rss_delta_mb']:>12.1f} {r['ttfb_ms']:>10.1f} "
+                  f"{r['total_ms']:>11.1f} {r['bytes'] / 1024 / 1024:>9.1f}")
+
+
+def _has_orjson():
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    main()
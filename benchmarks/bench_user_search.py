@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+用户搜索（/users/search）延迟基准测试
+
+在临时 SQLite 库里生成 N 个用户和一批好友关系，模拟搜索框逐字输入，
+对比原有写法（username LIKE '%q%' 全表扫描 + 每个结果一次好友关系查询）
+与索引搜索（前缀 B 树 / trigram / 手机号后四位 + 批量好友关系）的延迟。
+
+用法（在项目根目录执行）：
+    python -m benchmarks.bench_user_search
+    python -m benchmarks.bench_user_search --users 1000000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+_db_dir = tempfile.mkdtemp(prefix="nearus-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'bench.db')}"
+os.environ["USER_CACHE_TTL"] = "0"
+
+import app as nearus  # noqa: E402
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+db = nearus.db
+SYLLABLES = ["zhang", "wang", "li", "zhao", "chen", "liu", "yang", "huang", "zhou", "wu", "xiao", "ming", "hua", "lin"]
+SURNAMES = "张王李赵陈刘杨黄周吴"
+GIVEN = "小明华丽军强伟芳娜静敏"
+
+
+def setup(users):
+    rng = random.Random(42)
+    with nearus.app.app_context():
+        db.create_all()
+        nearus.ensure_user_search_index()
+        batch = []
+        for i in range(users):
+            name = "".join(rng.choice(SYLLABLES) for _ in range(2)) + str(i)
+            real_name = rng.choice(SURNAMES) + rng.choice(GIVEN) + rng.choice(GIVEN)
+            batch.append({"username": name, "real_name": real_name, "phone": f"1{i:010d}", "password_hash": "x"})
+            if len(batch) == 10000:
+                db.session.execute(nearus.insert(nearus.User), batch)
+                batch = []
+        if batch:
+            db.session.execute(nearus.insert(nearus.User), batch)
+        db.session.execute(nearus.insert(nearus.Friendship), [
+            {"user_id": 1, "friend_id": rng.randint(2, users), "status": "accepted"} for _ in range(200)
+        ])
+        db.session.commit()
+        db.session.execute(nearus.text("ANALYZE"))
+        db.session.commit()
+        return create_access_token(identity="1")
+
+
+def legacy_search(query, user_id):
+    """原实现：LIKE 全表扫描后逐个查询好友关系"""
+    users = nearus.User.query.filter(nearus.User.username.contains(query), nearus.User.id != user_id).limit(10).all()
+    for u in users:
+        nearus.Friendship.query.filter(
+            ((nearus.Friendship.user_id == user_id) & (nearus.Friendship.friend_id == u.id)) |
+            ((nearus.Friendship.user_id == u.id) & (nearus.Friendship.friend_id == user_id))
+        ).first()
+    return len(users)
+
+
+def time_legacy(queries, rounds):
+    samples = []
+    with nearus.app.app_context():
+        for _ in range(rounds):
+            for q in queries:
+                start = time.perf_counter()
+                legacy_search(q, 1)
+                samples.append(time.perf_counter() - start)
+            db.session.remove()
+    return samples
+
+
+def time_indexed(queries, rounds, token):
+    client = nearus.app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+    samples = []
+    for _ in range(rounds):
+        for q in queries:
+            start = time.perf_counter()
+            resp = client.get("/users/search", query_string={"q": q}, headers=headers)
+            samples.append(time.perf_counter() - start)
+            assert resp.status_code == 200
+    return samples
+
+
+def per_query(fn, queries, rounds, *args):
+    """逐个查询计时，便于定位慢查询"""
+    return {q: statistics.median(fn([q], rounds, *args)) for q in queries}
+
+
+def report(name, samples):
+    ordered = sorted(samples)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{name:<10} p50={statistics.median(ordered) * 1000:7.2f}ms  p95={p95 * 1000:7.2f}ms  max={ordered[-1] * 1000:7.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--per-query", action="store_true", help="输出每个查询的中位延迟")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    token = setup(args.users)
+    print(f"生成 {args.users} 个用户耗时 {time.perf_counter() - start:.1f}s")
+    # 逐字输入：前缀、子串、中文姓名、手机号后四位
+    queries = ["z", "zh", "zha", "zhan", "zhang", "angwu", "ming12", "张", "张小", "张小明", "0042", "9999"]
+    report("legacy", time_legacy(queries, args.rounds))
+    report("indexed", time_indexed(queries, args.rounds, token))
+    if args.per_query:
+        legacy = per_query(time_legacy, queries, args.rounds)
+        indexed = per_query(time_indexed, queries, args.rounds, token)
+        for q in queries:
+            print(f"  {q:<8} legacy={legacy[q] * 1000:7.2f}ms  indexed={indexed[q] * 1000:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
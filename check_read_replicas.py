@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+只读副本与响应缓存的读写一致性检查
+
+在临时目录里建主库，用 sync_sqlite_replica 同步出一个副本后不再同步，
+让副本一直落后。先匿名请求一次 GET /games 预热响应缓存，再在主库新增
+一个游戏并提交（缓存随之失效），然后检查：
+
+- 匿名请求（走响应缓存）必须看到新游戏，即缓存是从主库填充的；
+- 登录请求（不走缓存、走副本）看不到新游戏，确认副本确实落后。
+
+用法（在项目根目录执行）：
+    python -m check_read_replicas
+
+检查失败时以退出码 1 结束，可直接用于 CI 检查。
+"""
+
+import os
+import sys
+import tempfile
+
+_db_dir = tempfile.mkdtemp(prefix="nearus-replica-")
+PRIMARY_PATH = os.path.join(_db_dir, "primary.db")
+REPLICA_PATH = os.path.join(_db_dir, "replica.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{PRIMARY_PATH}"
+os.environ["DATABASE_REPLICA_URLS"] = f"sqlite:///{REPLICA_PATH}"
+os.environ["REPLICA_MAX_LAG_SECONDS"] = "3600"  # 副本落后多久都照常使用
+os.environ["REPLICA_LAG_CHECK_INTERVAL"] = "0"
+os.environ["RESPONSE_CACHE_BACKEND"] = "memory"
+
+import app as nearus  # noqa: E402
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+from sync_sqlite_replica import sync_once  # noqa: E402
+
+
+def game_names(response):
+    return {game["name"] for game in response.get_json()}
+
+
+def main():
+    nearus._ensure_db_initialized()
+    client = nearus.app.test_client()
+    client.post("/demo/bootstrap")
+    sync_once(PRIMARY_PATH, REPLICA_PATH)
+
+    with nearus.app.app_context():
+        admin = nearus.User.query.filter_by(username="admin").first()
+        headers = {"Authorization": "Bearer " + create_access_token(identity=str(admin.id))}
+
+    client.get("/games")  # 预热响应缓存
+    with nearus.app.app_context():
+        nearus.db.session.add(nearus.Game(name="副本一致性检查"))
+        nearus.db.session.commit()
+
+    failures = []
+    if "副本一致性检查" not in game_names(client.get("/games")):
+        failures.append("写入后的匿名 GET /games 返回了副本上的旧数据")
+    if "副本一致性检查" in game_names(client.get("/games", headers=headers)):
+        failures.append("登录请求读到了新游戏，副本没有落后，本检查无效")
+
+    for failure in failures:
+        print("失败: " + failure)
+    if not failures:
+        print("通过: 副本落后时匿名请求仍从主库填充缓存")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,15 @@ const checkSensitiveContent = async (content) => {
   }
 };
 
+// 列表接口每页返回一个 JSON 数组，下一页游标只放在 X-Next-Cursor 响应头里，最后一页不带这个头
+const fetchPage = async (url, cursor) => {
+  const response = await axios.get(url, cursor ? { params: { cursor } } : undefined);
+  return { data: response.data, nextCursor: response.headers['x-next-cursor'] || null };
+};
+
+// 数量只统计第一页，还有下一页时显示为 "N+"
+const pageCount = (response) => `${response.data.length}${response.headers['x-next-cursor'] ? '+' : ''}`;
+
 import './index.css';
 
 // 导入上下文提供者
@@ -31,6 +40,18 @@ import Quest from './components/Quest';
 import RealTimeNotifications from './components/RealTimeNotifications';
 import ImageWall from './components/ImageWall';
 
+// 列表底部的加载更多按钮，没有下一页时不显示
+function LoadMore({ cursor, onLoad }) {
+  if (!cursor) return null;
+  return (
+    <div style={{ textAlign: 'center', marginTop: '16px' }}>
+      <button className="btn btn-secondary" onClick={onLoad}>
+        加载更多
+      </button>
+    </div>
+  );
+}
+
 // 简洁的页面内弹窗组件
 function Toast({ message, type = 'info', onClose }) {
   const [isVisible, setIsVisible] = React.useState(true);
@@ -300,10 +321,10 @@ function Home({ auth }) {
           axios.get('/tasks')
         ]);
         setStats({
-          posts: postsRes.data.length,
-          groups: groupsRes.data.length,
-          activities: activitiesRes.data.length,
-          tasks: tasksRes.data.length
+          posts: pageCount(postsRes),
+          groups: pageCount(groupsRes),
+          activities: pageCount(activitiesRes),
+          tasks: pageCount(tasksRes)
         });
       } catch (err) {
         console.log('获取统计信息失败');
@@ -859,6 +880,7 @@ function Register({ auth }) {
 
 function Posts({ auth }) {
   const [items, setItems] = React.useState([]);
+  const [nextCursor, setNextCursor] = React.useState(null);
   const [content, setContent] = React.useState('');
   const [loading, setLoading] = React.useState(false);
   const [imagePreview, setImagePreview] = React.useState(null);
@@ -908,7 +930,8 @@ function Posts({ auth }) {
   React.useEffect(() => { 
     (async () => {
       try {
-        const { data } = await axios.get('/posts');
+        const { data, nextCursor } = await fetchPage('/posts');
+        setNextCursor(nextCursor);
         // 如果没有真实数据，使用示例数据
         if (data.length === 0) {
           setItems(samplePosts);
@@ -930,7 +953,8 @@ function Posts({ auth }) {
       setContent('');
       setImagePreview(null);
       setShowComposer(false);
-      const { data } = await axios.get('/posts');
+      const { data, nextCursor } = await fetchPage('/posts');
+      setNextCursor(nextCursor);
       setItems(data.length > 0 ? data : [...samplePosts, {
         id: Date.now(),
         content,
@@ -957,6 +981,16 @@ function Posts({ auth }) {
     setLoading(false);
   };
 
+  const loadMore = async () => {
+    try {
+      const page = await fetchPage('/posts', nextCursor);
+      setItems(prev => [...prev, ...page.data]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      console.log('加载更多动态失败');
+    }
+  };
+
   const formatTimeAgo = (timestamp) => {
     const now = new Date();
     const time = new Date(timestamp);
@@ -1262,12 +1296,14 @@ function Posts({ auth }) {
           ))
         )}
       </div>
+      <LoadMore cursor={nextCursor} onLoad={loadMore} />
     </div>
   );
 }
 
 function Groups() {
   const [groups, setGroups] = React.useState([]);
+  const [nextCursor, setNextCursor] = React.useState(null);
   const [loading, setLoading] = React.useState(true);
   const [showCreate, setShowCreate] = React.useState(false);
   const [newGroup, setNewGroup] = React.useState({ name: '', description: '', category: '' });
@@ -1279,8 +1315,9 @@ function Groups() {
 
   const loadGroups = async () => {
     try {
-    const { data } = await axios.get('/groups');
+      const { data, nextCursor } = await fetchPage('/groups');
       setGroups(data);
+      setNextCursor(nextCursor);
     } catch (error) {
       console.error('加载群组失败:', error);
     } finally {
@@ -1288,6 +1325,16 @@ function Groups() {
     }
   };
 
+  const loadMore = async () => {
+    try {
+      const page = await fetchPage('/groups', nextCursor);
+      setGroups(prev => [...prev, ...page.data]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      console.log('加载更多群组失败');
+    }
+  };
+
   const create = async () => {
     if (!newGroup.name.trim()) return;
     
@@ -1499,6 +1546,7 @@ function Groups() {
           ))
         )}
       </div>
+      <LoadMore cursor={nextCursor} onLoad={loadMore} />
     </div>
   );
 }
@@ -1999,6 +2047,7 @@ function Quests() {
 
 function Activities({ auth }) {
   const [items, setItems] = React.useState([]);
+  const [nextCursor, setNextCursor] = React.useState(null);
   const [title, setTitle] = React.useState('');
   const [description, setDescription] = React.useState('');
   const [location, setLocation] = React.useState('');
@@ -2071,7 +2120,8 @@ function Activities({ auth }) {
   React.useEffect(() => { 
     (async () => {
       try {
-        const { data } = await axios.get('/activities');
+        const { data, nextCursor } = await fetchPage('/activities');
+        setNextCursor(nextCursor);
         if (data.length === 0) {
           setItems(sampleActivities);
         } else {
@@ -2084,6 +2134,16 @@ function Activities({ auth }) {
     })(); 
   }, []);
 
+  const loadMore = async () => {
+    try {
+      const page = await fetchPage('/activities', nextCursor);
+      setItems(prev => [...prev, ...page.data]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      console.log('加载更多活动失败');
+    }
+  };
+
   const create = async () => {
     if (!title.trim() || !auth?.user) return;
     setLoading(true);
@@ -2101,7 +2161,8 @@ function Activities({ auth }) {
       setStartTime('');
       setMaxParticipants(20);
       setShowCreateForm(false);
-      const { data } = await axios.get('/activities');
+      const { data, nextCursor } = await fetchPage('/activities');
+      setNextCursor(nextCursor);
       setItems(data.length > 0 ? data : [...sampleActivities, {
         id: Date.now(),
         title,
@@ -2514,12 +2575,14 @@ function Activities({ auth }) {
           })
         )}
       </div>
+      <LoadMore cursor={nextCursor} onLoad={loadMore} />
     </div>
   );
 }
 
 function Tasks() {
   const [items, setItems] = React.useState([]);
+  const [nextCursor, setNextCursor] = React.useState(null);
   const [title, setTitle] = React.useState('');
   const [description, setDescription] = React.useState('');
   const [reward, setReward] = React.useState(10);
@@ -2531,13 +2594,24 @@ function Tasks() {
 
   React.useEffect(() => { (async () => {
     try {
-      const { data } = await axios.get('/tasks');
+      const { data, nextCursor } = await fetchPage('/tasks');
       setItems(data);
+      setNextCursor(nextCursor);
     } catch (err) {
       console.log('获取任务失败');
     }
   })(); }, []);
 
+  const loadMore = async () => {
+    try {
+      const page = await fetchPage('/tasks', nextCursor);
+      setItems(prev => [...prev, ...page.data]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      console.log('加载更多任务失败');
+    }
+  };
+
   const create = async () => {
     if (!title.trim()) {
       showToast('请填写任务标题', 'warning');
@@ -2554,8 +2628,9 @@ function Tasks() {
       setTitle('');
       setDescription('');
       setShowCreateForm(false);
-      const { data } = await axios.get('/tasks');
+      const { data, nextCursor } = await fetchPage('/tasks');
       setItems(data);
+      setNextCursor(nextCursor);
       showToast('✅ 任务发布成功！', 'success');
     } catch (err) {
       showToast('❌ 发布任务失败', 'error');
@@ -2566,8 +2641,9 @@ function Tasks() {
   const complete = async (id) => {
     try {
       await axios.post(`/tasks/${id}/complete`);
-      const { data } = await axios.get('/tasks');
+      const { data, nextCursor } = await fetchPage('/tasks');
       setItems(data);
+      setNextCursor(nextCursor);
       showToast('🎉 任务完成！积分已到账', 'success');
     } catch (err) {
       showToast('❌ 完成任务失败', 'error');
@@ -2830,6 +2906,7 @@ function Tasks() {
           })
         )}
       </div>
+      <LoadMore cursor={nextCursor} onLoad={loadMore} />
 
       {/* 已完成任务 */}
       {completedTasks.length > 0 && (
@@ -3922,6 +3999,12 @@ function Chat() {
     try {
       const response = await axios.get(`/chat/rooms/${roomId}/messages`);
       setMessages(response.data);
+      // 已读水位推进到已展示的最大发布序号，之后才审核通过的消息仍算未读
+      const seqs = response.data.map(msg => msg.published_seq).filter(seq => seq != null);
+      if (seqs.length > 0) {
+        await axios.post(`/chat/rooms/${roomId}/read`, { seq: Math.max(...seqs) });
+      }
+      setRooms(prev => prev.map(room => room.id === roomId ? { ...room, unread_count: 0 } : room));
     } catch (err) {
       showToast("❌ 加载消息失败", "error");
     }
@@ -4057,8 +4140,17 @@ function Chat() {
                         transition: "all 0.2s ease"
                       }}
                     >
-                      <div style={{ fontWeight: "600", marginBottom: "4px", fontSize: "0.95rem" }}>{room.name}</div>
-                      <div style={{ fontSize: "0.8rem", opacity: currentRoom?.id === room.id ? 0.9 : 0.7, marginBottom: "6px" }}>{room.description}</div>
+                      <div style={{ display: "flex", justifyContent: "space-between", alignItems: "center", marginBottom: "4px" }}>
+                        <div style={{ fontWeight: "600", fontSize: "0.95rem" }}>{room.name}</div>
+                        {room.unread_count > 0 && currentRoom?.id !== room.id && (
+                          <span style={{ background: "#ef4444", color: "white", borderRadius: "10px", padding: "0 6px", fontSize: "0.75rem" }}>
+                            {room.unread_count > 99 ? "99+" : room.unread_count}
+                          </span>
+                        )}
+                      </div>
+                      <div style={{ fontSize: "0.8rem", opacity: currentRoom?.id === room.id ? 0.9 : 0.7, marginBottom: "6px", overflow: "hidden", textOverflow: "ellipsis", whiteSpace: "nowrap" }}>
+                        {room.last_message ? room.last_message.content : room.description}
+                      </div>
                       <div style={{ fontSize: "0.75rem", display: "flex", alignItems: "center", gap: "4px" }}>
                         {room.user_role === "owner" ? "👑 群主" : "👤 成员"}
                       </div>
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+启动耗时分析
+
+在干净的子进程里用 `python -X importtime` 导入目标模块，按模块和顶层包
+汇总导入耗时，并检查总耗时是否超出预算。
+
+用法（在项目根目录执行）：
+    python -m profile_startup                     # 分析 app.py
+    python -m profile_startup --top 30 --budget-ms 800
+    python -m profile_startup --module create_demo_data
+
+总耗时超过 --budget-ms 时以退出码 1 结束，可直接用于 CI 检查。
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# 子进程里测量导入目标模块的墙钟时间，结果打印到 stdout
+PROBE = (
+    "import time; start = time.perf_counter(); import {module}; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def run_importtime(module):
+    """返回 (总耗时秒, [(模块名, 自身微秒, 累计微秒, 层级), ...])"""
+    env = dict(os.environ, PYTHONIOENCODING="utf-8")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"导入 {module} 失败")
+
+    records = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        records.append((name.strip(), int(self_us), int(cumulative_us), depth))
+
+    total = float(proc.stdout.strip().splitlines()[-1])
+    return total, records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app", help="要分析的模块，默认 app")
+    parser.add_argument("--top", type=int, default=20, help="列出耗时最多的前 N 项")
+    parser.add_argument("--budget-ms", type=float, default=None, help="启动耗时预算（毫秒）")
+    args = parser.parse_args()
+
+    total, records = run_importtime(args.module)
+
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in records:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"导入 {args.module} 总耗时: {total * 1000:.1f} ms（共 {len(records)} 个模块）\n")
+
+    print(f"按顶层包汇总（自身耗时之和）前 {args.top} 名:")
+    print(f"{'ms':>10}  package")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{self_us / 1000:>10.1f}  {package}")
+
+    print(f"\n按单个模块自身耗时前 {args.top} 名:")
+    print(f"{'self ms':>10} {'cum ms':>10}  module")
+    for name, self_us, cumulative_us, _ in sorted(records, key=lambda r: -r[1])[:args.top]:
+        print(f"{self_us / 1000:>10.1f} {cumulative_us / 1000:>10.1f}  {name}")
+
+    if args.budget_ms is not None:
+        used = total * 1000
+        if used > args.budget_ms:
+            print(f"\n超出启动预算: {used:.1f} ms > {args.budget_ms:.1f} ms")
+            raise SystemExit(1)
+        print(f"\n启动预算内: {used:.1f} ms <= {args.budget_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
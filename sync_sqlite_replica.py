@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地只读副本同步
+
+用 SQLite 在线备份接口把主库完整复制到副本文件，复制期间主库照常读写，
+副本上的读者看到的始终是某一次完整的快照。配合 DATABASE_REPLICA_URLS
+在本地模拟只读副本，--interval 控制同步间隔，也就是副本的延迟。
+
+用法（在项目根目录执行）：
+    python -m sync_sqlite_replica                              # 同步一次
+    python -m sync_sqlite_replica --interval 2                 # 每 2 秒同步一次
+    python -m sync_sqlite_replica instance/neighbor_app.db instance/replica.db
+
+然后启动应用：
+    DATABASE_REPLICA_URLS=sqlite:///neighbor_app.replica.db python app.py
+（相对路径的 SQLite URL 与主库一样位于 instance/ 目录下）
+"""
+
+import argparse
+import sqlite3
+import time
+
+
+def sync_once(primary_path, replica_path):
+    source = sqlite3.connect(f"file:{primary_path}?mode=ro", uri=True)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("primary", nargs="?", default="instance/neighbor_app.db")
+    parser.add_argument("replica", nargs="?", default="instance/neighbor_app.replica.db")
+    parser.add_argument("--interval", type=float, default=0, help="同步间隔秒数，0 表示只同步一次")
+    args = parser.parse_args()
+
+    while True:
+        start = time.perf_counter()
+        sync_once(args.primary, args.replica)
+        print(f"已同步 {args.primary} -> {args.replica}，耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()